@@ -16,8 +16,8 @@ export const AuthContext = createContext({
     userList: {
         page: [],
         pagination: {
-            current: -1,
-            count: 0,
+            cursor: 0,
+            next: null,
         },
     },
     setUserList: () => { },
@@ -8,14 +8,16 @@ export default function useUserList() {
   const axiosPrivateInstance = useAxiosPrivate();
   const { setUserList } = useContext(AuthContext);
 
-  async function getUsers(page = 1) {
+  // cursor: id of the last user of the previous page, 0 for the first one
+  async function getUsers(cursor = 0) {
     if (!isLoggedIn) {
       return;
     }
 
     try {
       const { data } = await axiosPrivateInstance.get("auth/users", {
-        params: { page },
+        // only the columns of the table
+        params: { cursor, fields: "email,balance_eth" },
       });
 
       setUserList(data);
@@ -7,14 +7,20 @@ export default function Home() {
     const { user } = useAuth();
     const { userList } = useContext(AuthContext);
     const getUsers = useUserList();
-    const [page, setPage] = useState(1);
+    // cursors of the pages visited, the last one is the current page
+    const [cursors, setCursors] = useState([0]);
+    const page = cursors.length;
+    const cursor = cursors[cursors.length - 1];
     const [isLoading, setLoading] = useState(true);
 
 
     useEffect(() => {
-        getUsers(page)
+        getUsers(cursor)
             .finally(() => setLoading(false));
-    }, [user, page]);
+    }, [user, cursor]);
+
+    const previous = () => setCursors(cursors.slice(0, -1));
+    const next = () => setCursors([...cursors, userList.pagination.next]);
 
     return (
         <div className='container mt-3'>
@@ -41,7 +47,7 @@ export default function Home() {
                         <tbody>
                             {userList.page && userList.page.map((item, i) =>
                                 <tr key={i}>
-                                    <th scope="row">{i + 1}</th>
+                                    <th scope="row">{(page - 1) * userList.pagination.size + i + 1}</th>
                                     <td>{item?.email}</td>
                                     <td>{item?.balance_eth} ETH</td>
                                 </tr>
@@ -49,35 +55,35 @@ export default function Home() {
                         </tbody>
                     </table>
                 }
-                {userList.pagination && userList.pagination.count
+                {userList.pagination
                     && <nav aria-label="Page navigation">
                         <ul className="pagination justify-content-center">
-                            {(page - 1) === 1
+                            {page > 1
                                 && <>
                                     <li className="page-item">
                                         <button className="page-link text-dark"
-                                            onClick={() => setPage(page - 1)} aria-label="Previous">
+                                            onClick={previous} aria-label="Previous">
                                             <span aria-hidden="true">&laquo;</span>
                                         </button>
                                     </li>
                                     <li className="page-item">
                                         <button className="page-link text-dark"
-                                            onClick={() => setPage(page - 1)}>{page - 1}</button>
+                                            onClick={previous}>{page - 1}</button>
                                     </li>
                                 </>
                             }
                             <li className="page-item">
                                 <button className="page-link text-light active">{page}</button>
                             </li>
-                            {(page + 1) < userList.pagination.count
+                            {userList.pagination.next !== null
                                 && <>
                                     <li className="page-item">
                                         <button className="page-link text-dark"
-                                            onClick={() => setPage(page + 1)}>{page + 1}</button>
+                                            onClick={next}>{page + 1}</button>
                                     </li>
                                     <li className="page-item">
                                         <button className="page-link text-dark"
-                                            onClick={() => setPage(page + 1)} aria-label="Next">
+                                            onClick={next} aria-label="Next">
                                             <span aria-hidden="true">&raquo;</span>
                                         </button>
                                     </li>
@@ -3,10 +3,11 @@ import { useNavigate } from "react-router-dom"
 import useAuth from '../../hooks/useAuth'
 import useLogout from "../../hooks/useLogout"
 import useUser from '../../hooks/useUser'
+import { API_URL } from '../../api/apiConfig'
 
 export default function User() {
 
-    const { user } = useAuth()
+    const { user, setUser } = useAuth()
 
     const navigate = useNavigate()
     const logout = useLogout()
@@ -17,6 +18,19 @@ export default function User() {
         getUser()
     }, [])
 
+    // balance pushed by the server on every block that changes it
+    useEffect(() => {
+        if (!user?.wallet_address_eth) {
+            return
+        }
+        const events = new EventSource(`${API_URL}auth/user/stream`, { withCredentials: true })
+        events.addEventListener('balance', (event) => {
+            const { balance_eth } = JSON.parse(event.data)
+            setUser((current) => ({ ...current, balance_eth }))
+        })
+        return () => events.close()
+    }, [user?.wallet_address_eth])
+
 
     async function onLogout() {
         setLoading(true)
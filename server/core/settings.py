@@ -10,11 +10,14 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 from dotenv import dotenv_values
+from django.core.exceptions import ImproperlyConfigured
 
-ENV = dotenv_values(".env")
+# `.env`, overridden by the environment (e.g. `ETH_NODE_BACKEND=tester python ...`)
+ENV = {**dotenv_values(".env"), **os.environ}
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -23,12 +26,19 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/4.1/howto/deployment/checklist/
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = "aHR0cDovLzQ1LjE0MC4xNDcuMjA4OjU0MzIx"
-
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+# SECURITY WARNING: keep the secret key used in production secret!
+# Never commit it: set SECRET_KEY in the environment or in `.env`.
+# Required, DEBUG included: a key generated per process would invalidate the
+# tokens on every restart, and between the processes serving them.
+SECRET_KEY = ENV.get("SECRET_KEY")
+if not SECRET_KEY:
+    raise ImproperlyConfigured(
+        "SECRET_KEY is not set, add it to the environment or to `.env`"
+    )
+
 ALLOWED_HOSTS = []
 
 
@@ -51,6 +61,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first: its total covers the other middlewares
+    "djweb3.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -59,6 +71,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "djweb3.middleware.RPCViewMiddleware",
 ]
 
 ROOT_URLCONF = "core.urls"
@@ -145,6 +158,26 @@ CSRF_COOKIE_HTTP_ONLY = True
 CSRF_TRUSTED_ORIGINS = ["http://localhost:3000"]
 CORS_EXPOSE_HEADERS = ["Content-Type", "X-CSRFToken"]
 SESSION_COOKIE_SECURE = True
+
+USERS_PAGE = {
+    # users per page of `auth/users`, unless `size` is given
+    "size": 5,
+    # max. `size`
+    "max_size": 100,
+    # seconds the approximate total is cached for
+    "total_ttl": 60,
+}
+
+SERVER_TIMING = {
+    # `Server-Timing` response header, shown by the browser devtools
+    "header": DEBUG,
+    "slow": {
+        # seconds, slower requests are kept for `djweb3/timing/slow`
+        "threshold": 0.5,
+        # max. slow requests kept, oldest dropped
+        "size": 100,
+    },
+}
 CSRF_COOKIE_SAMESITE = "None"
 SESSION_COOKIE_SAMESITE = "None"
 
@@ -187,6 +220,18 @@ SIMPLE_JWT = {
     "AUTH_COOKIE_PATH": "/",  # The path of the auth cookie.
     # Whether to set the flag restricting cookie leaks on cross-site requests. This can be 'Lax', 'Strict', or None to disable the flag.
     "AUTH_COOKIE_SAMESITE": "None",  # TODO: Modify to Lax
+    # Authenticate without the DB: access tokens verified once per process,
+    # users built from their claims. A deactivated or demoted user keeps the
+    # rights of its access token until it expires (ACCESS_TOKEN_LIFETIME).
+    "AUTH_STATELESS": False,
+    "AUTH_TOKEN_CACHE": {"maxsize": 4096},
+    # Blacklisted refresh tokens held in memory: new ones read every `ttl`
+    # seconds, expired ones dropped every `rebuild` seconds. Each read goes
+    # `overlap` seconds back, for the rows committed late or by a skewed clock.
+    "BLACKLIST_CACHE": {"ttl": 5, "rebuild": 3600, "overlap": 60},
+    # `OutstandingToken` rows of the logins, inserted `size` at a time or
+    # every `interval` seconds.
+    "OUTSTANDING_BATCH": {"size": 100, "interval": 1.0},
 }
 
 
@@ -203,7 +248,62 @@ REST_FRAMEWORK = {
 AUTH_USER_MODEL = "user.User"
 
 ETH_NODE = {
-    "address": ENV.get("ETH_NODE_ENDPOINT", "http://127.0.0.1:8545"),
+    # comma separated replicas, reads go to the fastest healthy one
+    "address": ENV.get("ETH_NODE_ENDPOINT", "http://127.0.0.1:8545").split(","),
+    # `node`: the endpoints above; `tester`: an in-memory chain, in-process
+    "backend": ENV.get("ETH_NODE_BACKEND", "node"),
+    "tester": {
+        # seconds added to every request, to mimic a node
+        "latency": 0,
+    },
+    "router": {
+        # seconds between two background probes of every endpoint
+        "probe_interval": 5,
+        # weight of the latest sample in the latency and error rate averages
+        "alpha": 0.3,
+        # endpoints failing more often are ejected until a probe succeeds
+        "max_error_rate": 0.5,
+    },
+    "client": {
+        # keep-alive connections kept open to the node, per process
+        "pool_size": 10,
+        # seconds, (connect, read)
+        "timeout": (3.05, 10),
+        # seconds before connecting again to an endpoint that failed
+        "retry_after": 1,
+    },
+    "cache": {
+        # seconds between two reads of the chain head (blocks are ~12s apart)
+        "head_ttl": 1.0,
+        # max. cached (address, block number) balances
+        "maxsize": 4096,
+    },
+    "signers": {
+        # max. local accounts kept ready to sign, least recently used dropped
+        "maxsize": 1024,
+        # seconds an account stays loaded
+        "ttl": 3600,
+    },
+    "metrics": {
+        # seconds between two samples of the node health
+        "interval": 5,
+        # head block the lag is measured against, the most advanced replica if None
+        "reference": ENV.get("ETH_NODE_REFERENCE_ENDPOINT"),
+        # serve `djweb3/metrics` for Prometheus, to admins only
+        "endpoint": False,
+    },
+    "wallet_pool": {
+        # keypairs generated ahead of registrations
+        "size": 64,
+        # refill as soon as the pool drops to it
+        "low_water": 16,
+    },
+    "stream": {
+        # seconds between two SSE keep-alive comments
+        "keepalive": 15,
+        # events buffered per connected client, older ones are dropped
+        "backlog": 16,
+    },
     "chain_id": {
         "1": not DEBUG,  # Mainnet,
         "11155111": DEBUG,  # Sepolia testnet
@@ -295,6 +395,10 @@ ETH_NODE = {
         },
         "nousb": True,
         "lightkdf": True,
+        # long-lived clef for the signer operations of `ethnode`
+        "session": {
+            "ipcpath": "/app/clef/session.ipc",
+        },
         "master_password": "1234567890",  # > 10 characters
         "rules_js": """function OnSignerStartup() {
     return "Approve"
@@ -328,3 +432,30 @@ function ApproveSignData() {
 }""",
     },
 }
+
+# host side of `ETH_NODE["execution"]["api"]["ipc"]["ipcpath"]`, in the `execution`
+# volume of the local stack (`ethnode`)
+ETH_NODE["stack_ipc_address"] = str(
+    ETH_NODE["output"]["container"].joinpath(
+        "execution",
+        ETH_NODE["execution"]["api"]["ipc"]["ipcpath"].removeprefix("/root/"),
+    )
+)
+# WebSocket and IPC endpoints of the first node of `ETH_NODE["address"]`: those
+# of the local stack by default, to be set explicitly along with ETH_NODE_ENDPOINT
+LOCAL_STACK = "ETH_NODE_ENDPOINT" not in ENV
+# `newHeads` subscriptions need a WebSocket, see `ETH_NODE["execution"]["api"]["ws"]`
+ETH_NODE["ws_address"] = ENV.get(
+    "ETH_NODE_WS_ENDPOINT",
+    (
+        "ws://127.0.0.1:%s" % ETH_NODE["execution"]["api"]["ws"]["port"]
+        if LOCAL_STACK and ETH_NODE["execution"]["api"]["ws"]
+        else None
+    ),
+)
+ETH_NODE["ipc_address"] = ENV.get(
+    "ETH_NODE_IPC_ENDPOINT",
+    ETH_NODE["stack_ipc_address"] if LOCAL_STACK else None,
+)
+# auto | ipc | ws | http, see `djweb3.utils.client.Client.endpoints`
+ETH_NODE["transport"] = ENV.get("ETH_NODE_TRANSPORT", "auto")
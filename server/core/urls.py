@@ -3,5 +3,6 @@ from django.urls import path, include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('auth/', include('user.urls', namespace='user'))
+    path('auth/', include('user.urls', namespace='user')),
+    path('djweb3/', include('djweb3.urls', namespace='djweb3')),
 ]
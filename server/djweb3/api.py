@@ -1,24 +1,73 @@
 from djweb3.utils.cli.execution import Execution
 from djweb3.utils.models import SingletonAbstract
-from djweb3.utils.exception import ConnectionError
-from web3 import Web3
+from djweb3.utils.cache import LRUCache
+from djweb3.utils.client import Client
+from djweb3.utils.router import Router
+from djweb3.utils.signing import SignerRegistry
+from djweb3.utils.exception import ConnectionError, RPCError
+from djweb3.utils.instrument import RPCStats
+from djweb3.utils.metrics import REGISTRY
+from djweb3.utils import tester
+from web3 import AsyncWeb3
 from eth_account import Account
 from eth_account.signers.local import LocalAccount
-from web3.middleware.signing import construct_sign_and_send_raw_middleware
 from django.conf import settings
+import asyncio
 import logging
+import threading
+import requests
+from time import monotonic, perf_counter
 
 logger = logging.getLogger(__name__)
 
 
 class EthNode(SingletonAbstract):
+    # client of the fastest healthy node, when `EthNode()` was last called
     w3 = None
+    router = None
+    # (block number, monotonic time it was read at)
+    head = None
+    # {(address, block number): wei}, flushed whenever a new head is seen
+    balances = LRUCache(settings.ETH_NODE["cache"]["maxsize"])
+    __head_lock = threading.Lock()
+    __router_lock = threading.Lock()
+    # {endpoints: Router}
+    __routers = {}
 
-    def __init__(self, provider_endpoint=settings.ETH_NODE["address"]):
-        assert provider_endpoint is not None, "You must set provider_endpoint"
-        EthNode.w3 = Web3(Web3.HTTPProvider(provider_endpoint))
-        if not EthNode.w3.is_connected():
-            raise ConnectionError()
+    def __init__(self, provider_endpoint=None):
+        """
+        @param provider_endpoint: defaults to the endpoints of `ETH_NODE["transport"]`
+        """
+        if provider_endpoint is None:
+            provider_endpoint = Client.endpoints()
+        assert len(provider_endpoint) != 0, "You must set provider_endpoint"
+        EthNode.router = EthNode.get_router(provider_endpoint)
+        # connected once per process, `__init__` runs on every `EthNode()`
+        EthNode.w3 = EthNode.router.call(lambda uri: Client.get(uri).w3)
+
+    @classmethod
+    def get_router(cls, provider_endpoint):
+        """
+        @param provider_endpoint: node URI, or list of replicas
+        """
+        uris = (
+            (provider_endpoint,)
+            if isinstance(provider_endpoint, str)
+            else tuple(provider_endpoint)
+        )
+        with cls.__router_lock:
+            if uris not in cls.__routers:
+                cls.__routers[uris] = Router(
+                    uris, probe=lambda uri: Client.get(uri).w3.eth.block_number
+                )
+            return cls.__routers[uris]
+
+    @classmethod
+    def read(cls, fn):
+        """
+        `fn(w3)` on the fastest healthy node, failing over to the next ones
+        """
+        return cls.router.call(lambda uri: fn(Client.get(uri).w3))
 
     @classmethod
     def get_account(cls, private_key):
@@ -26,7 +75,7 @@ class EthNode(SingletonAbstract):
         assert private_key.startswith("0x"), "Private key must start with 0x hex prefix"
 
         account: LocalAccount = Account.from_key(private_key)
-        cls.w3.middleware_onion.add(construct_sign_and_send_raw_middleware(account))
+        SignerRegistry.add(account)
         return account
 
     @classmethod
@@ -34,7 +83,243 @@ class EthNode(SingletonAbstract):
         account = cls.w3.eth.account.create()
         return account
 
+    @classmethod
+    def get_block_number(cls):
+        """
+        Chain head, read from the node at most once every `head_ttl` seconds
+        """
+        with cls.__head_lock:
+            now = monotonic()
+            if (
+                cls.head is None
+                or now - cls.head[1] >= settings.ETH_NODE["cache"]["head_ttl"]
+            ):
+                cls.__set_head(cls.read(lambda w3: w3.eth.block_number), now)
+            return cls.head[0]
+
+    @classmethod
+    def set_head(cls, block_number):
+        """
+        Record a head read elsewhere, e.g. pushed by a `newHeads` subscription
+        or read by `AsyncEthNode`
+        """
+        with cls.__head_lock:
+            cls.__set_head(block_number, monotonic())
+
+    @classmethod
+    def __set_head(cls, block_number, now):
+        if cls.head is not None and block_number <= cls.head[0]:
+            # same head, or a replica lagging behind
+            block_number = cls.head[0]
+        else:
+            # balances read at an older head are stale
+            cls.balances.clear()
+        cls.head = (block_number, now)
+
     @classmethod
     def get_balance(cls, address):
-        wei = cls.w3.eth.get_balance(address)
+        block_number = cls.get_block_number()
+        key = (address.lower(), block_number)
+        wei = cls.balances.get(key)
+        if wei is LRUCache.MISSING:
+            wei = cls.read(lambda w3: w3.eth.get_balance(address, block_number))
+            cls.balances.set(key, wei)
         return cls.w3.from_wei(wei, "ether")
+
+    @classmethod
+    def get_balances(cls, addresses, block_number=None):
+        """
+        Balances of many addresses in one JSON-RPC batch, all read at the same block
+        @param block_number: defaults to the chain head
+        @return: {address: balance in ether}
+        """
+        addresses = list(dict.fromkeys(addresses))
+        if len(addresses) == 0:
+            return {}
+        if block_number is None:
+            block_number = cls.get_block_number()
+        found = {
+            address: cls.balances.get((address.lower(), block_number))
+            for address in addresses
+        }
+        missing = [address for address, wei in found.items() if wei is LRUCache.MISSING]
+        if len(missing) != 0:
+            results = cls.batch_request(
+                [
+                    ("eth_getBalance", [address, hex(block_number)])
+                    for address in missing
+                ]
+            )
+            for address, wei in zip(missing, results):
+                found[address] = int(wei, 16)
+                cls.balances.set((address.lower(), block_number), found[address])
+        return {
+            address: cls.w3.from_wei(wei, "ether") for address, wei in found.items()
+        }
+
+    @classmethod
+    def cache_info(cls):
+        return {"head": cls.head and cls.head[0], **cls.balances.info()}
+
+    @classmethod
+    def render(cls):
+        """
+        @return: Prometheus text lines of `cache_info()`, rendered with `REGISTRY`
+        """
+        info = cls.cache_info()
+        return [
+            "# HELP ethnode_balance_cache_hits_total Balances read from the cache",
+            "# TYPE ethnode_balance_cache_hits_total counter",
+            "ethnode_balance_cache_hits_total %d" % info["hits"],
+            "# HELP ethnode_balance_cache_misses_total Balances read from the node",
+            "# TYPE ethnode_balance_cache_misses_total counter",
+            "ethnode_balance_cache_misses_total %d" % info["misses"],
+            "# HELP ethnode_balance_cache_size Balances cached at the current head",
+            "# TYPE ethnode_balance_cache_size gauge",
+            "ethnode_balance_cache_size %d" % info["size"],
+        ]
+
+    @classmethod
+    def router_info(cls):
+        return cls.router.info()
+
+    @classmethod
+    def batch_request(cls, calls):
+        """
+        @param calls: e.g. [("eth_getBalance", ["0x...", "latest"]), ...]
+        @return: results, in the same order as `calls`
+        """
+        # pinned to HTTP: one round trip, where IPC/WebSocket send the calls
+        # one after the other
+        http = Client.endpoints("http")
+        router = cls.get_router(http) if len(http) != 0 else cls.router
+        return router.call(lambda uri: cls.__batch_request(Client.get(uri), calls))
+
+    @classmethod
+    def __batch_request(cls, client, calls):
+        if client.session is None:
+            # IPC/WebSocket/tester: no batching, but no connection setup per
+            # call either; through the middlewares, the tester's formatters
+            results = []
+            for method, params in calls:
+                try:
+                    results.append(client.w3.manager.request_blocking(method, params))
+                except ValueError as e:
+                    raise RPCError(method, params, e)
+            return results
+
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)
+        ]
+        # sent outside of web3, so outside of its middlewares
+        start = perf_counter()
+        try:
+            response = client.session.post(
+                client.endpoint, json=payload, timeout=client.timeout
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            RPCStats.record("batch", perf_counter() - start, True)
+            raise ConnectionError(e)
+        RPCStats.record("batch", perf_counter() - start, False)
+
+        body = response.json()
+        if not isinstance(body, list):
+            # the whole batch got rejected, e.g. batching disabled on the node
+            raise RPCError("batch", len(calls), body.get("error"))
+
+        replies = {reply.get("id"): reply for reply in body}
+        results = []
+        for i, (method, params) in enumerate(calls):
+            reply = replies.get(i)
+            if reply is None or "error" in reply:
+                raise RPCError(method, params, reply and reply.get("error"))
+            results.append(reply["result"])
+        return results
+
+
+class AsyncEthNode(SingletonAbstract):
+    """
+    `EthNode` counterpart for async views, backed by web3's async HTTP provider
+    """
+
+    # {uri: AsyncWeb3}
+    clients = {}
+    # shared with `EthNode`, as is its head: a balance at a given block is the
+    # same for both
+    balances = EthNode.balances
+    # shared with `EthNode`: same nodes, same health
+    router = None
+
+    def __init__(self, provider_endpoint=None):
+        # web3's async providers are HTTP only
+        if provider_endpoint is None:
+            provider_endpoint = Client.endpoints("http")
+        assert len(provider_endpoint) != 0, "You must set provider_endpoint"
+        AsyncEthNode.router = EthNode.get_router(provider_endpoint)
+
+    @classmethod
+    def client(cls, uri):
+        if uri not in cls.clients:
+            w3 = AsyncWeb3(
+                tester.Tester.async_provider()
+                if uri == tester.ENDPOINT
+                else AsyncWeb3.AsyncHTTPProvider(uri)
+            )
+            w3.middleware_onion.inject(RPCStats.async_middleware, "rpc_stats", layer=0)
+            cls.clients[uri] = w3
+        return cls.clients[uri]
+
+    @classmethod
+    async def read(cls, fn):
+        """
+        `await fn(w3)` on the fastest healthy node, failing over to the next ones
+        """
+        return await cls.router.acall(lambda uri: fn(cls.client(uri)))
+
+    @classmethod
+    async def is_connected(cls):
+        return await cls.read(lambda w3: w3.is_connected())
+
+    @classmethod
+    async def get_block_number(cls):
+        """
+        Chain head, read from the node at most once every `head_ttl` seconds
+        """
+        head = EthNode.head
+        if (
+            head is None
+            or monotonic() - head[1] >= settings.ETH_NODE["cache"]["head_ttl"]
+        ):
+            EthNode.set_head(await cls.read(lambda w3: w3.eth.block_number))
+        return EthNode.head[0]
+
+    @classmethod
+    async def get_balance(cls, address, block_number=None):
+        if block_number is None:
+            block_number = await cls.get_block_number()
+        key = (address.lower(), block_number)
+        wei = cls.balances.get(key)
+        if wei is LRUCache.MISSING:
+            wei = await cls.read(lambda w3: w3.eth.get_balance(address, block_number))
+            cls.balances.set(key, wei)
+        return AsyncWeb3.from_wei(wei, "ether")
+
+    @classmethod
+    async def get_balances(cls, addresses):
+        """
+        Balances of many addresses, requested concurrently at the same block
+        @return: {address: balance in ether}
+        """
+        addresses = list(dict.fromkeys(addresses))
+        if len(addresses) == 0:
+            return {}
+        block_number = await cls.get_block_number()
+        balances = await asyncio.gather(
+            *[cls.get_balance(address, block_number) for address in addresses]
+        )
+        return dict(zip(addresses, balances))
+
+
+REGISTRY.register(EthNode)
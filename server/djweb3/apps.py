@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class Djweb3Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'djweb3'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        connection_created.connect(self.time_queries)
+
+    @staticmethod
+    def time_queries(sender, connection, **kwargs):
+        from djweb3.utils.timing import Timing
+
+        # every connection, including those of `sync_to_async` threads; fired
+        # again on every reconnection (`CONN_MAX_AGE`) of the same connection
+        if Timing.db_wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(Timing.db_wrapper)
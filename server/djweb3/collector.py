@@ -0,0 +1,160 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep, time
+import requests
+from django.conf import settings
+
+from djweb3.utils.client import Client
+from djweb3.utils.metrics import Gauge, Histogram
+from djweb3.utils.models import SingletonAbstract
+
+logger = logging.getLogger(__name__)
+
+
+class NodeCollector(SingletonAbstract):
+    """
+    Samples the health of the execution client(s) and the signer on a
+    schedule, every call of a sample running concurrently. Scrapes read the
+    last sample only, they never wait on the node.
+    """
+
+    up = Gauge("ethnode_up", "1 if the last sample succeeded", ["service", "endpoint"])
+    head_block = Gauge("ethnode_head_block", "Latest block number", ["endpoint"])
+    block_lag = Gauge(
+        "ethnode_block_lag", "Blocks behind the reference head", ["endpoint"]
+    )
+    peer_count = Gauge("ethnode_peer_count", "Connected peers", ["endpoint"])
+    syncing = Gauge("ethnode_syncing", "1 while the node is syncing", ["endpoint"])
+    sync_current_block = Gauge(
+        "ethnode_sync_current_block", "Block the sync reached", ["endpoint"]
+    )
+    sync_highest_block = Gauge(
+        "ethnode_sync_highest_block", "Block the sync aims at", ["endpoint"]
+    )
+    latency = Histogram(
+        "ethnode_rpc_latency_seconds",
+        "JSON-RPC round trip of the samples",
+        ["service", "endpoint", "method"],
+    )
+    sampled_at = Gauge(
+        "ethnode_last_sample_timestamp_seconds", "Unix time of the last sample"
+    )
+
+    session = requests.Session()
+    __thread = None
+    __lock = threading.Lock()
+
+    def __init__(self, interval=None):
+        """
+        @param interval: seconds between two samples, `ETH_NODE["metrics"]["interval"]`
+        by default; set by the first call only
+        """
+        with NodeCollector.__lock:
+            if NodeCollector.__thread is None:
+                NodeCollector.__thread = threading.Thread(
+                    target=self.sample_forever,
+                    args=(interval or settings.ETH_NODE["metrics"]["interval"],),
+                    name="collector",
+                    daemon=True,
+                )
+                NodeCollector.__thread.start()
+
+    @classmethod
+    def sample_forever(cls, interval):
+        while True:
+            try:
+                cls.sample()
+            except Exception as e:
+                logger.error("node sample failed  %s", e)
+            sleep(interval)
+
+    @classmethod
+    def sample(cls):
+        calls = [
+            ("execution", endpoint, method)
+            for endpoint in Client.endpoints()
+            for method in ("eth_blockNumber", "net_peerCount", "eth_syncing")
+        ]
+        if settings.ETH_NODE["metrics"]["reference"]:
+            calls.append(
+                (
+                    "reference",
+                    settings.ETH_NODE["metrics"]["reference"],
+                    "eth_blockNumber",
+                )
+            )
+        if settings.ETH_NODE["signer"]["api"]["http"]:
+            calls.append(
+                (
+                    "signer",
+                    "http://127.0.0.1:%s"
+                    % settings.ETH_NODE["signer"]["api"]["http"].get("port", "8550"),
+                    "account_version",
+                )
+            )
+
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            results = list(pool.map(lambda call: cls.call(*call), calls))
+
+        failed = {
+            (service, endpoint)
+            for (service, endpoint, _), result in zip(calls, results)
+            if result is None
+        }
+        heads = {}
+        for (service, endpoint, method), result in zip(calls, results):
+            cls.up.set(
+                int((service, endpoint) not in failed),
+                service=service,
+                endpoint=endpoint,
+            )
+            if result is None or service == "signer":
+                continue
+            if method == "eth_blockNumber":
+                heads[(service, endpoint)] = int(result, 16)
+            elif method == "net_peerCount":
+                cls.peer_count.set(int(result, 16), endpoint=endpoint)
+            elif method == "eth_syncing":
+                cls.syncing.set(int(result is not False), endpoint=endpoint)
+                if result is not False:
+                    cls.sync_current_block.set(
+                        int(result["currentBlock"], 16), endpoint=endpoint
+                    )
+                    cls.sync_highest_block.set(
+                        int(result["highestBlock"], 16), endpoint=endpoint
+                    )
+
+        reference = heads.pop(
+            ("reference", settings.ETH_NODE["metrics"]["reference"]),
+            # without reference: the most advanced replica
+            max(heads.values(), default=None),
+        )
+        for (_, endpoint), head in heads.items():
+            cls.head_block.set(head, endpoint=endpoint)
+            if reference is not None:
+                cls.block_lag.set(max(reference - head, 0), endpoint=endpoint)
+        cls.sampled_at.set(time())
+
+    @classmethod
+    def call(cls, service, endpoint, method):
+        """
+        @return: JSON-RPC result, None on failure
+        """
+        start = perf_counter()
+        try:
+            if service == "execution":
+                reply = Client.get(endpoint).w3.provider.make_request(method, [])
+            else:
+                reply = cls.session.post(
+                    endpoint,
+                    json={"jsonrpc": "2.0", "id": 1, "method": method, "params": []},
+                    timeout=settings.ETH_NODE["client"]["timeout"],
+                ).json()
+        except Exception as e:
+            logger.warning("%s %s %s failed  %s", service, endpoint, method, e)
+            return None
+        cls.latency.observe(
+            perf_counter() - start, service=service, endpoint=endpoint, method=method
+        )
+        return reply.get("result") if "error" not in reply else None
@@ -0,0 +1,84 @@
+import statistics
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from djweb3.utils.client import Client
+from djweb3.utils.event import Logger
+from djweb3.utils.exception import ConnectionError
+
+
+class Command(BaseCommand):
+    help = "Benchmark the transports (IPC, WebSocket, HTTP) to the Ethereum node"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--transport",
+            nargs="+",
+            choices=Client.TRANSPORTS,
+            default=Client.TRANSPORTS,
+            help="Transports to benchmark, all the configured ones by default",
+        )
+        parser.add_argument(
+            "-n",
+            "--calls",
+            type=int,
+            default=200,
+            help="Calls per transport",
+        )
+        parser.add_argument(
+            "--method",
+            default="eth_blockNumber",
+            help="JSON-RPC method called, without params",
+        )
+
+    def handle(self, *args, **options):
+        if options["calls"] <= 0:
+            raise CommandError("--calls must be positive")
+
+        self.stdout.write(
+            "%-6s %-45s %10s %10s %10s %10s"
+            % ("", "endpoint", "mean ms", "p50 ms", "p95 ms", "calls/s")
+        )
+        for transport in options["transport"]:
+            endpoints = Client.endpoints(transport)
+            if len(endpoints) == 0:
+                Logger.info("skip", "ethbench", "%s not configured" % transport)
+                continue
+            try:
+                result = self.benchmark(
+                    Client.get(endpoints[0]), options["method"], options["calls"]
+                )
+            except ConnectionError as e:
+                Logger.info("skip", "ethbench", "%s unreachable  %s" % (transport, e))
+                continue
+            self.stdout.write(
+                "%-6s %-45s %10.3f %10.3f %10.3f %10.1f"
+                % (
+                    transport,
+                    endpoints[0],
+                    result["mean"] * 1000,
+                    result["p50"] * 1000,
+                    result["p95"] * 1000,
+                    result["throughput"],
+                )
+            )
+
+    def benchmark(self, client, method, calls):
+        provider = client.w3.provider
+        # connection setup is not what is measured
+        provider.make_request(method, [])
+
+        latencies = []
+        start = perf_counter()
+        for _ in range(calls):
+            call_start = perf_counter()
+            provider.make_request(method, [])
+            latencies.append(perf_counter() - call_start)
+        elapsed = perf_counter() - start
+
+        latencies.sort()
+        return {
+            "mean": statistics.fmean(latencies),
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "throughput": calls / elapsed,
+        }
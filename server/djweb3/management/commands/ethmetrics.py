@@ -0,0 +1,73 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from djweb3.collector import NodeCollector
+from djweb3.utils.event import Logger
+from djweb3.utils.metrics import REGISTRY
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = "Sample the Ethereum node health, in Prometheus text format"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Print one sample and exit",
+        )
+        parser.add_argument(
+            "--port",
+            type=int,
+            help="Serve the metrics at http://<addr>:<port>/metrics",
+        )
+        parser.add_argument(
+            "--addr",
+            default="127.0.0.1",
+            help="Listening interface of --port",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.ETH_NODE["metrics"]["interval"],
+            help="Seconds between two samples",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            NodeCollector.sample()
+            self.stdout.write(REGISTRY.render(), ending="")
+            return
+
+        NodeCollector(options["interval"])
+        if options["port"] is None:
+            while True:
+                sleep(options["interval"])
+                self.stdout.write(REGISTRY.render())
+
+        server = ThreadingHTTPServer((options["addr"], options["port"]), MetricsHandler)
+        Logger.info(
+            "serve",
+            "metrics",
+            "http://%s:%s/metrics" % (options["addr"], options["port"]),
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
@@ -1,16 +1,25 @@
+import json
 import os
 import subprocess
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from django.core.exceptions import ValidationError
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from djweb3.utils import (
     dump_json,
     dump_yaml,
+    sha256sum,
 )
 from djweb3.utils.cli.consensus import Consensus
 from djweb3.utils.event import Logger
 from djweb3.utils.mapper import Mapper
 from djweb3.utils.cli.signer import Signer
+from djweb3.utils.cli.session import SignerSession
+from djweb3.utils.cli.readiness import wait_ipc, wait_rpc, wait_services
+from djweb3.utils.cli.planner import Plan
 from djweb3.utils.cli.execution import Execution
 from djweb3.utils.validator import Validator
 from djweb3.utils.normalizer import Normalizer
@@ -25,6 +34,8 @@ CHAIN_ID = next(
 NETWORK = next(
     filter(lambda pair: pair[1] and pair[0], settings.ETH_NODE["network"].items())
 )[0]
+# label of each compose service: hash of its resolved config
+CONFIG_HASH = "djweb3.config-hash"
 
 
 class Command(BaseCommand):
@@ -41,7 +52,7 @@ class Command(BaseCommand):
         parser.add_argument(
             "--start",
             action="store_true",
-            help="Start the node",
+            help="Start the node in the background, and wait until it is ready",
         )
         parser.add_argument(
             "--generate",
@@ -54,6 +65,21 @@ class Command(BaseCommand):
             action="store_true",
             help="Generate docker-compose.json",
         )
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Regenerate docker-compose yml, recreate only the services whose config changed",
+        )
+        parser.add_argument(
+            "--rotate-jwt",
+            action="store_true",
+            help="Generate a new JWT secret, the existing one is kept otherwise",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only print the --apply plan",
+        )
         parser.add_argument(
             "--init",
             action="store_true",
@@ -72,8 +98,12 @@ class Command(BaseCommand):
         parser.add_argument(
             "-u",
             "--newaccount",
-            action="store_true",
-            help="Request a new wallet address",
+            type=int,
+            nargs="?",
+            const=1,
+            default=0,
+            metavar="N",
+            help="Request N new wallet addresses, 1 by default",
         )
         # OPTIONS
         parser.add_argument(
@@ -87,6 +117,24 @@ class Command(BaseCommand):
             "--password",
             help="A password that is at least 10 characters long",
         )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Max. accounts created at the same time by --newaccount, their "
+            "credentials are stored one at a time",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=300,
+            help="Seconds --start waits for the services to be ready, and for the "
+            "signer session to answer",
+        )
+        parser.add_argument(
+            "--report",
+            help="JSON report of the accounts created by --newaccount, '-' for stdout",
+        )
         parser.add_argument(
             "--http",
             action="store_true",
@@ -212,14 +260,19 @@ class Command(BaseCommand):
     execution = None
     consensus = None
     jwtsecret = None
+    session = None
+    # `clef setpw` rewrites the whole credentials.json: one at a time
+    setpw_lock = threading.Lock()
 
     def handle(self, *args, **options):
+        action = None
         try:
             self.options = options
             for action in [
                 "reset",
                 "start",
                 "generate",
+                "apply",
                 "init",
                 "up",
                 "down",
@@ -230,8 +283,13 @@ class Command(BaseCommand):
 
         except Exception as e:
             Logger.error(__name__.split(".")[-1], e)
-            self.down()
+            # accounts are created on a running stack, a failure leaves it up
+            if action != "newaccount":
+                self.down()
             raise e
+        finally:
+            if self.session is not None:
+                self.session.stop()
 
     def reset(self):
         if self.options["reset"]:
@@ -242,11 +300,43 @@ class Command(BaseCommand):
 
     def start(self):
         self.init()
-        self.up()
+        subprocess.check_call([*self.cmd["up"], "--detach"], cwd=Path.abs())
+        self.wait_ready()
+
+    def wait_ready(self):
+        services = {}
+        if settings.ETH_NODE["signer"]["api"]["http"]:
+            services["signer"] = (
+                wait_rpc,
+                "http://127.0.0.1:%s"
+                % settings.ETH_NODE["signer"]["api"]["http"].get("port", "8550"),
+                "account_version",
+            )
+        if self.options["http"]:
+            services["execution"] = (
+                wait_rpc,
+                "http://127.0.0.1:%s" % self.options["http.port"],
+                "web3_clientVersion",
+            )
+        if not self.options["ipcdisable"]:
+            services["execution ipc"] = (
+                wait_ipc,
+                settings.ETH_NODE["stack_ipc_address"],
+                "web3_clientVersion",
+            )
+        wait_services(services, timeout=self.options["timeout"])
 
     def generate(self):
-        # generate 64 digit hex string
-        self.jwtsecret = "0x%s" % os.urandom(32).hex()
+        jwtsecret = Path.abs("tmp/jwtsecret")
+        if os.path.isfile(jwtsecret) and not self.options["rotate_jwt"]:
+            # a new secret means restarting the clients that share it
+            self.jwtsecret = Execution.get_jwtsecret(Path.execution)
+        else:
+            # generate 64 digit hex string
+            self.jwtsecret = "0x%s" % os.urandom(32).hex()
+            if os.path.isfile(jwtsecret):
+                with open(jwtsecret, "w") as fd:
+                    fd.write(self.jwtsecret)
         compose_dict = self.compose(
             [
                 "signer",
@@ -263,9 +353,117 @@ class Command(BaseCommand):
             compose_dict,
             settings.ETH_NODE["output"]["compose"]["yaml"],
         )
+        return compose_dict
+
+    def apply(self):
+        if not os.path.isdir(Path.abs()):
+            raise CommandError("Nothing to apply, run --init first")
+
+        # compared with the containers, not with the last generated file
+        previous = self.running()
+        current = (
+            self.compose(["signer", "execution"])
+            if self.options["dry_run"]
+            else self.generate()
+        )["services"]
+
+        plan = {}
+        for service, props in current.items():
+            if service not in previous:
+                plan[service] = "create"
+            elif (
+                previous[service]["hash"] != props["labels"][CONFIG_HASH]
+                or previous[service]["state"] != "running"
+            ):
+                plan[service] = "recreate"
+            elif self.options["rotate_jwt"] and service in ("execution", "consensus"):
+                # the secret is mounted, not part of the config
+                plan[service] = "recreate"
+            else:
+                plan[service] = "keep"
+        for service in set(previous) - set(current):
+            plan[service] = "remove"
+
+        for service, action in sorted(plan.items()):
+            self.stdout.write("%-10s %s" % (action, service))
+        if self.options["dry_run"]:
+            return
+
+        changed = [s for s, action in plan.items() if action in ("create", "recreate")]
+        if len(changed) != 0:
+            # never without services: `up` would then recreate all of them
+            subprocess.check_call(
+                [
+                    *self.cmd["up"],
+                    "--detach",
+                    "--no-deps",
+                    "--force-recreate",
+                    *changed,
+                ],
+                cwd=Path.abs(),
+            )
+        removed = [
+            previous[s]["id"] for s, action in plan.items() if action == "remove"
+        ]
+        if len(removed) != 0:
+            # no longer in the compose file, `down <service>` does not know them
+            subprocess.check_call(["docker", "rm", "--force", *removed])
+
+    def running(self):
+        """
+        @return: {service: {"id": ..., "hash": CONFIG_HASH label, "state": ...}}
+        of the containers of the compose project, stopped ones included
+        """
+        project = self.compose()["name"]
+        try:
+            output = subprocess.check_output(
+                [
+                    "docker",
+                    "ps",
+                    "--all",
+                    "--filter",
+                    "label=com.docker.compose.project=%s" % project,
+                    # not the `docker-compose run` ones, e.g. the signer session
+                    "--filter",
+                    "label=com.docker.compose.oneoff=False",
+                    "--format",
+                    "{{json .}}",
+                ],
+                text=True,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            raise CommandError("Containers not listed: %s" % e)
+
+        result = {}
+        for line in output.splitlines():
+            container = json.loads(line)
+            # "key=value,..."; values have no comma
+            labels = dict(
+                label.split("=", 1)
+                for label in container["Labels"].split(",")
+                if "=" in label
+            )
+            result[labels["com.docker.compose.service"]] = {
+                "id": container["ID"],
+                "hash": labels.get(CONFIG_HASH),
+                "state": container["State"],
+            }
+        return result
 
     def init(self):
-        self.generate()
+        # only the signer steps depend on each other, the rest runs concurrently
+        plan = (
+            Plan("init")
+            .add("generate", self.generate)
+            .add("signer", self.init_signer, after=["generate"])
+            .add("newaccount", self.newaccount, after=["signer"])
+            .add("execution", self.init_execution, after=["generate"])
+            .add("consensus", self.init_consensus, after=["generate"])
+        )
+        plan.run()
+        plan.report()
+
+    def init_signer(self):
         # TODO REF/DP: Dependency injection | Builder
         self.signer = Signer(
             path=Path.signer,
@@ -276,8 +474,11 @@ class Command(BaseCommand):
                 "cwd": Path.abs(),
             },
         )
-        self.newaccount()
+
+    def init_execution(self):
         self.execution = Execution(path=Path.execution, jwtsecret=self.jwtsecret)
+
+    def init_consensus(self):
         self.consensus = Consensus(path=Path.consensus, jwtsecret=self.jwtsecret)
 
     def up(self):
@@ -288,28 +489,88 @@ class Command(BaseCommand):
 
     def newaccount(self):
         try:
-            if Validator.password(self.options["password"]):
-                Signer.newaccount(
-                    self.options["password"],
-                    cmd={
-                        "entrypoint": self.cmd["signer"]["run"],
-                        "bin": settings.ETH_NODE["signer"]["bin"],
-                        "cwd": Path.abs(),
-                    },
-                )
+            if not Validator.password(self.options["password"]):
+                return
+        except ValidationError as e:
+            Logger.error("newaccount", e)
+            return
+
+        count = self.options["newaccount"] or 1
+        start = perf_counter()
+        self.start_session()
+        with ThreadPoolExecutor(max_workers=self.options["concurrency"]) as pool:
+            accounts = list(pool.map(self.create_account, range(count)))
+        failed = [account for account in accounts if "error" in account]
+        report = {
+            "requested": count,
+            "concurrency": self.options["concurrency"],
+            "elapsed": perf_counter() - start,
+            "created": [account for account in accounts if "error" not in account],
+            "failed": failed,
+        }
+        if self.options["report"] == "-":
+            self.stdout.write(json.dumps(report, indent=2))
+        elif self.options["report"]:
+            dump_json(report, self.options["report"])
+
+        Logger.info(
+            "init",
+            "newaccount",
+            "%s/%s created in %.1fs" % (count - len(failed), count, report["elapsed"]),
+        )
+        if len(failed) != 0:
+            raise CommandError("%s account(s) could not be created" % len(failed))
+
+    def create_account(self, index):
+        """
+        @return: address and timings (seconds) of the steps, or the error
+        """
+        start = perf_counter()
+        try:
+            address = Signer.newaccount(
+                self.options["password"],
+                session=self.session,
+                env=settings.ETH_NODE["signer"],
+            )
+            created = perf_counter()
+            with self.setpw_lock:
+                stored = perf_counter()
                 Signer.setpw(
                     self.options["password"],
                     settings.ETH_NODE["signer"]["master_password"],
+                    address=address,
                     path=Path.signer,
                     cmd={
-                        "entrypoint": self.cmd["signer"]["run"],
+                        "entrypoint": self.session.entrypoint,
                         "bin": settings.ETH_NODE["signer"]["bin"],
                         "cwd": Path.abs(),
                     },
                 )
-            Logger.info("init", "newaccount", "success")
+            return {
+                "address": "0x%s" % address,
+                "newaccount": created - start,
+                "setpw_wait": stored - created,
+                "setpw": perf_counter() - stored,
+                "total": perf_counter() - start,
+            }
         except Exception as e:
-            Logger.error("newaccount", e)
+            Logger.info("fail", "newaccount", "#%s  %r" % (index, e))
+            return {"index": index, "error": repr(e), "total": perf_counter() - start}
+
+    def start_session(self):
+        # one clef process for all the signer operations of this run
+        if self.session is None:
+            self.session = SignerSession(
+                path=Path.signer,
+                env=settings.ETH_NODE["signer"],
+                cmd={
+                    "compose": self.cmd["compose"],
+                    "bin": settings.ETH_NODE["signer"]["bin"],
+                    "cwd": Path.abs(),
+                },
+                timeout=self.options["timeout"],
+            )
+        return self.session
 
     def compose(self, selected=[]):
         fragment = {}
@@ -395,7 +656,7 @@ class Command(BaseCommand):
         }
 
     def compose_service(self, props):
-        return {
+        service = {
             "depends_on": props["depends_on"],
             "container_name": props["client"],
             "hostname": Normalizer.label(
@@ -422,6 +683,10 @@ class Command(BaseCommand):
             "volumes": props["volumes"],
             "restart": settings.ETH_NODE["restart-policy"],
         }
+        service["labels"] = {
+            CONFIG_HASH: sha256sum(json.dumps(service, sort_keys=True, default=str))
+        }
+        return service
 
     @property
     def cmd(self):
@@ -440,6 +705,7 @@ class Command(BaseCommand):
             }
             for service in ["signer", "execution", "consensus"]
         }
+        result["compose"] = ["docker-compose", "-f", filename]
         result["up"] = ["docker-compose", "-f", filename, "up"]
         result["down"] = ["docker-compose", "-f", filename, "down"]
 
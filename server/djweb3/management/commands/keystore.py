@@ -0,0 +1,261 @@
+import json
+import os
+import queue
+from datetime import datetime, timezone
+from getpass import getpass
+from multiprocessing import Pool
+from time import perf_counter
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from eth_account import Account
+from djweb3.utils.cli.keystore import Catalog
+from djweb3.utils.cli.signer import Signer
+from djweb3.utils.event import Logger
+from djweb3.utils.path import Path
+
+Path = Path(str(settings.ETH_NODE["output"]["container"]))
+
+# geth `--lightkdf` scrypt cost
+LIGHT_SCRYPT_N = 1 << 12
+# jobs queued or running in the pool, per worker
+BACKLOG = 32
+
+
+def address_of(text):
+    """
+    @return: lowercase address of a keystore, without 0x, None if it has none
+    """
+    try:
+        address = json.loads(text).get("address")
+    except (ValueError, AttributeError):
+        return None
+    return address.lower().removeprefix("0x") if isinstance(address, str) else None
+
+
+def reencrypt(job):
+    """
+    Runs in a worker process: the KDF work is CPU bound
+    @param job: (keystore JSON text, its password, new password, kdf, kdf cost)
+    """
+    text, password, new_password, kdf, iterations = job
+    keyfile = None
+    try:
+        keyfile = json.loads(text)
+        private_key = Account.decrypt(keyfile, password)
+        return Account.encrypt(
+            private_key, new_password, kdf=kdf, iterations=iterations
+        )
+    except Exception as e:
+        return {"error": str(e), "address": (keyfile or {}).get("address")}
+
+
+class Command(BaseCommand):
+    help = "Import/export encrypted keystores of the signer in bulk"
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument(
+            "--import",
+            dest="source",
+            help="Directory of keystore files, or JSON lines file, to add to the signer",
+        )
+        action.add_argument(
+            "--export",
+            dest="destination",
+            help="JSON lines file to write the signer keystores to",
+        )
+        # passwords are read from files or prompted for: an argument is
+        # visible in `ps` and in the shell history
+        parser.add_argument(
+            "-w",
+            "--password-file",
+            help="File holding the password of the keystores in the signer, "
+            "prompted for if not given",
+        )
+        parser.add_argument(
+            "--transfer-password-file",
+            help="File holding the password of the imported/exported keystores, "
+            "defaults to the signer one",
+        )
+        parser.add_argument(
+            "--kdf",
+            choices=["scrypt", "pbkdf2"],
+            default="scrypt",
+            help="Key derivation function of the written keystores",
+        )
+        parser.add_argument(
+            "-j",
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Processes sharing the encryption work",
+        )
+
+    def handle(self, *args, **options):
+        options["password"] = self.read_password(
+            options["password_file"], "Signer keystores password: "
+        )
+        transfer_password = (
+            self.read_password(options["transfer_password_file"])
+            if options["transfer_password_file"]
+            else options["password"]
+        )
+        iterations = (
+            LIGHT_SCRYPT_N
+            if options["kdf"] == "scrypt" and settings.ETH_NODE["signer"]["lightkdf"]
+            else None
+        )
+        keystore = Path.signer("data/keystore")
+        if not os.path.isdir(keystore):
+            raise CommandError(
+                "No signer keystore in %s, run ethnode --init" % keystore
+            )
+
+        start = perf_counter()
+        if options["source"]:
+            jobs = (
+                (
+                    text,
+                    transfer_password,
+                    options["password"],
+                    options["kdf"],
+                    iterations,
+                )
+                for text in self.read(options["source"], skip=set())
+            )
+            done, failed = self.run(
+                jobs,
+                options["workers"],
+                self.write_file(Catalog.get(Path.signer)),
+            )
+        else:
+            jobs = (
+                (
+                    text,
+                    options["password"],
+                    transfer_password,
+                    options["kdf"],
+                    iterations,
+                )
+                for text in self.read(keystore)
+            )
+            with open(options["destination"], "w") as fd:
+                done, failed = self.run(jobs, options["workers"], self.write_line(fd))
+
+        Logger.info(
+            "keystore",
+            "import" if options["source"] else "export",
+            "%s done, %s failed in %.1fs" % (done, failed, perf_counter() - start),
+        )
+
+    def read_password(self, filename, prompt=None):
+        if filename is None:
+            return getpass(prompt)
+        try:
+            with open(filename) as fd:
+                return fd.readline().rstrip("\r\n")
+        except OSError as e:
+            raise CommandError("Password not read: %s" % e)
+
+    def run(self, jobs, workers, write):
+        done = failed = 0
+        # sliding window: at most `BACKLOG` jobs per worker queued or running,
+        # the next one is submitted as soon as any completes (`imap_unordered`
+        # would read all of `jobs` ahead of the workers)
+        results = queue.Queue()
+        pending = 0
+
+        def collect():
+            nonlocal done, failed, pending
+            keyfile = results.get()
+            pending -= 1
+            if "error" in keyfile:
+                failed += 1
+                Logger.info("fail", "keystore", "%(address)s  %(error)s" % keyfile)
+                return
+            # written by this thread only, as they complete
+            write(keyfile)
+            done += 1
+
+        with Pool(workers) as pool:
+            for job in jobs:
+                while pending >= workers * BACKLOG:
+                    collect()
+                pool.apply_async(
+                    reencrypt,
+                    (job,),
+                    callback=results.put,
+                    error_callback=lambda e: results.put(
+                        {"error": str(e), "address": None}
+                    ),
+                )
+                pending += 1
+            while pending > 0:
+                collect()
+        return done, failed
+
+    def read(self, source, skip=None):
+        """
+        @param skip: addresses read, not to read again; those in the signer
+            keystore are skipped too
+        @return: keystore JSON texts, one by one
+        """
+        for text in self.read_all(source):
+            if skip is not None:
+                address = address_of(text)
+                if address in skip or (
+                    address is not None
+                    and Signer.has_wallet_address_eth(Path.signer, address)
+                ):
+                    # no KDF work for a key the signer already has
+                    Logger.info("skip", "keystore", "%s already imported" % address)
+                    continue
+                if address is not None:
+                    skip.add(address)
+            yield text
+
+    def read_all(self, source):
+        if os.path.isdir(source):
+            for basename in sorted(os.listdir(source)):
+                with open(os.path.join(source, basename)) as fd:
+                    yield fd.read()
+        else:
+            with open(source) as fd:
+                for line in fd:
+                    if line.strip():
+                        yield line
+
+    def write_file(self, catalog):
+        """
+        @param catalog: `Catalog` of the signer keystore, the files written are
+            added to it
+        """
+
+        def write(keyfile):
+            # for the keystores without address, known once decrypted only
+            if catalog.exists(keyfile["address"]):
+                Logger.info(
+                    "skip", "keystore", "%s already imported" % keyfile["address"]
+                )
+                return
+            basename = "UTC--%s000Z--%s" % (
+                datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M-%S.%f"),
+                keyfile["address"].lower(),
+            )
+            mtime = os.stat(catalog.directory).st_mtime_ns
+            fd = os.open(
+                os.path.join(catalog.directory, basename),
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                0o600,
+            )
+            with os.fdopen(fd, "w") as fd:
+                json.dump(keyfile, fd)
+            catalog.add(basename, mtime)
+
+        return write
+
+    def write_line(self, fd):
+        def write(keyfile):
+            fd.write(json.dumps(keyfile) + "\n")
+
+        return write
@@ -0,0 +1,77 @@
+from time import perf_counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from djweb3.utils.instrument import RPCStats
+from djweb3.utils.timing import Timing
+
+
+class RPCViewMiddleware:
+    """
+    Tags the JSON-RPC requests sent while serving a request with its view
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            RPCStats.view.set("-")
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # runs in the context of the view, sync or async
+        RPCStats.view.set(request.resolver_match.view_name)
+        return None
+
+
+class ServerTimingMiddleware:
+    """
+    `Server-Timing` header with the time spent on the ORM, the node, the
+    authentication and the serialization; slow requests are kept for staff
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        phases, token = Timing.start()
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            Timing.stop(token)
+        return self.finalize(request, response, phases, perf_counter() - start)
+
+    async def __acall__(self, request):
+        phases, token = Timing.start()
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            Timing.stop(token)
+        return self.finalize(request, response, phases, perf_counter() - start)
+
+    def finalize(self, request, response, phases, total):
+        Timing.sample(request, response.status_code, phases, total)
+        if settings.SERVER_TIMING["header"]:
+            response["Server-Timing"] = Timing.header(phases, total)
+        return response
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import threading
+from web3 import AsyncWeb3, WebsocketProviderV2
+from django.conf import settings
+
+from djweb3.api import EthNode
+from djweb3.utils.models import SingletonAbstract
+
+logger = logging.getLogger(__name__)
+
+
+class Listener:
+    """
+    Events of one connected client, consumed in its event loop
+    """
+
+    def __init__(self, address, loop):
+        self.address = address
+        self.loop = loop
+        self.events = asyncio.Queue(settings.ETH_NODE["stream"]["backlog"])
+        # last balance queued, written in `loop` only
+        self.sent = None
+
+    def push(self, event):
+        """
+        Thread safe, from the publishing thread
+        """
+        if event["balance_eth"] == self.sent:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.offer, event)
+        except RuntimeError:
+            # the loop is closed, the client is gone
+            pass
+
+    def offer(self, event):
+        try:
+            self.events.put_nowait(event)
+            self.sent = event["balance_eth"]
+        except asyncio.QueueFull:
+            # the client is not reading, it gets the next change
+            pass
+
+
+class HeadSubscription(SingletonAbstract):
+    """
+    One `newHeads` subscription per process. On every block, the balances of
+    the connected listeners only are read again, and the changed ones pushed.
+    """
+
+    listeners = set()
+    __thread = None
+    __lock = threading.Lock()
+
+    def __init__(self, endpoint=settings.ETH_NODE["ws_address"]):
+        assert endpoint is not None, "You must set endpoint"
+        with HeadSubscription.__lock:
+            if HeadSubscription.__thread is None:
+                HeadSubscription.__thread = threading.Thread(
+                    target=asyncio.run,
+                    args=(self.listen(endpoint),),
+                    name="newHeads",
+                    daemon=True,
+                )
+                HeadSubscription.__thread.start()
+
+    @classmethod
+    def subscribe(cls, address, balance=None):
+        """
+        @param balance: balance the client already has, not pushed again
+        @return: `Listener`, its `events` queue gets {"block": ..., "balance_eth": ...}
+        for `address`; to be called in the client's event loop
+        """
+        listener = Listener(address, asyncio.get_running_loop())
+        listener.sent = balance
+        with cls.__lock:
+            cls.listeners.add(listener)
+        return listener
+
+    @classmethod
+    def unsubscribe(cls, listener):
+        with cls.__lock:
+            cls.listeners.discard(listener)
+
+    @classmethod
+    async def listen(cls, endpoint, retry=1):
+        while True:
+            try:
+                async with AsyncWeb3.persistent_websocket(
+                    WebsocketProviderV2(endpoint)
+                ) as w3:
+                    await w3.eth.subscribe("newHeads")
+                    retry = 1
+                    async for message in w3.ws.process_subscriptions():
+                        block_number = message["result"]["number"]
+                        try:
+                            # balance reads are blocking, keep the socket serviced
+                            await asyncio.to_thread(cls.publish, block_number)
+                        except Exception as e:
+                            # e.g. a replica behind this head: skip the block,
+                            # keep the subscription
+                            logger.warning(
+                                "block %s not published  %s", block_number, e
+                            )
+            except Exception as e:
+                logger.error("newHeads subscription lost  %s", e)
+            await asyncio.sleep(retry)
+            retry = min(retry * 2, 60)
+
+    @classmethod
+    def publish(cls, block_number):
+        EthNode.set_head(block_number)
+        with cls.__lock:
+            listeners = list(cls.listeners)
+        if len(listeners) == 0:
+            return
+
+        balances = EthNode().get_balances(
+            {listener.address for listener in listeners}, block_number
+        )
+        for listener in listeners:
+            listener.push(
+                {"block": block_number, "balance_eth": balances[listener.address]}
+            )
@@ -1,3 +1,491 @@
-from django.test import TestCase
+import json
+import os
+import socket
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import SimpleTestCase, TestCase, override_settings
+from eth_account import Account
+from rest_framework.test import APIClient
+from web3 import Web3
+from djweb3.api import AsyncEthNode, EthNode
+from djweb3.collector import NodeCollector
+from djweb3.utils.client import Client
+from djweb3.utils.exception import ConnectionError
+from djweb3.utils.cli.keystore import Catalog
+from djweb3.utils.cli.planner import Plan
+from djweb3.utils.cli.readiness import Deadline, backoff, wait_path, wait_port
+from djweb3.utils.instrument import RPCStats
+from djweb3.utils.cache import LRUCache
+from djweb3.utils.metrics import REGISTRY
+from djweb3.utils.router import Router
+from djweb3.utils.signing import SignerRegistry
+from djweb3.utils.tester import Tester
+from djweb3.utils.timing import Timing
 
-# Create your tests here.
+TESTER = {**settings.ETH_NODE, "backend": "tester"}
+
+
+@override_settings(ETH_NODE=TESTER)
+class EthNodeTest(SimpleTestCase):
+    def setUp(self):
+        EthNode()
+        EthNode.head = None
+        EthNode.balances.clear()
+        self.addresses = [Account.create().address for _ in range(3)]
+        for i, address in enumerate(self.addresses):
+            Tester.fund(address, (i + 1) * 10**18)
+
+    def test_batch_request(self):
+        results = EthNode.batch_request(
+            [("eth_getBalance", [address, "latest"]) for address in self.addresses]
+        )
+        self.assertEqual(
+            [int(wei, 16) for wei in results], [10**18, 2 * 10**18, 3 * 10**18]
+        )
+
+    def test_get_balances(self):
+        balances = EthNode.get_balances([*self.addresses, self.addresses[0]])
+        self.assertEqual(
+            balances,
+            {address: Decimal(i + 1) for i, address in enumerate(self.addresses)},
+        )
+
+    def test_get_balances_cached(self):
+        EthNode.get_balances(self.addresses)
+        before = EthNode.balances.info()
+        self.assertEqual(
+            EthNode.get_balances(self.addresses)[self.addresses[0]], Decimal(1)
+        )
+        after = EthNode.balances.info()
+        self.assertEqual(after["hits"] - before["hits"], 3)
+        self.assertEqual(after["misses"], before["misses"])
+
+    def test_new_head_flushes_balances(self):
+        EthNode.get_balances(self.addresses)
+        Tester.fund(self.addresses[0], 10**18)
+        EthNode.set_head(EthNode.head[0] + 1)
+        self.assertEqual(len(EthNode.balances), 0)
+        self.assertEqual(
+            EthNode.get_balances(self.addresses)[self.addresses[0]], Decimal(2)
+        )
+
+    def test_async_shares_head(self):
+        AsyncEthNode()
+        block_number = async_to_sync(AsyncEthNode.get_block_number)()
+        self.assertEqual(EthNode.head[0], block_number)
+        EthNode.get_balances(self.addresses)
+        # same head, the balances read by `EthNode` are kept
+        async_to_sync(AsyncEthNode.get_balances)(self.addresses)
+        self.assertEqual(len(EthNode.balances), 3)
+
+    def test_cache_metrics(self):
+        EthNode.get_balances(self.addresses)
+        EthNode.get_balances(self.addresses)
+        self.assertIn(
+            "ethnode_balance_cache_hits_total %d" % EthNode.balances.info()["hits"],
+            REGISTRY.render(),
+        )
+
+
+class ClientTest(SimpleTestCase):
+    # nothing listens on port 1, the connection is refused right away
+    DOWN = "http://127.0.0.1:1"
+
+    def tearDown(self):
+        Client.close()
+
+    @override_settings(
+        ETH_NODE={
+            **settings.ETH_NODE,
+            "address": ["http://node-1:8545", "http://node-2:8545"],
+            "ws_address": "ws://node-1:8546",
+            "ipc_address": None,
+        }
+    )
+    def test_auto_one_endpoint_per_node(self):
+        self.assertEqual(
+            Client.endpoints("auto"), ["ws://node-1:8546", "http://node-2:8545"]
+        )
+        self.assertEqual(Client.endpoints("ws"), ["ws://node-1:8546"])
+
+    def test_failure_cached(self):
+        with self.assertRaises(ConnectionError):
+            Client.get(self.DOWN)
+        with mock.patch.object(Client, "__init__") as init:
+            with self.assertRaises(ConnectionError):
+                Client.get(self.DOWN)
+        init.assert_not_called()
+
+    def test_retry_after(self):
+        client = {**settings.ETH_NODE["client"], "retry_after": 0}
+        with override_settings(ETH_NODE={**settings.ETH_NODE, "client": client}):
+            with self.assertRaises(ConnectionError):
+                Client.get(self.DOWN)
+            with mock.patch.object(Client, "__init__", side_effect=OSError) as init:
+                with self.assertRaises(OSError):
+                    Client.get(self.DOWN)
+        init.assert_called_once()
+
+
+@override_settings(
+    ETH_NODE={
+        **settings.ETH_NODE,
+        "router": {
+            **settings.ETH_NODE["router"],
+            # probed by the tests only
+            "probe_interval": 3600,
+        },
+    }
+)
+class RouterTest(SimpleTestCase):
+    LATENCY = {"a": 0.2, "b": 0.1, "c": 0.3}
+
+    def setUp(self):
+        self.now = 0.0
+        self.down = set()
+        patcher = mock.patch("djweb3.utils.router.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = Router(["a", "b", "c"], probe=self.node)
+
+    def node(self, uri):
+        if uri in self.down:
+            raise ConnectionError(uri)
+        self.now += self.LATENCY[uri]
+        return uri
+
+    def ejected(self):
+        return [info["uri"] for info in self.router.info() if info["ejected"]]
+
+    def test_fastest_first(self):
+        self.router.probe_all()
+        self.assertEqual([e.uri for e in self.router.select()], ["b", "a", "c"])
+        self.assertEqual(self.router.call(self.node), "b")
+
+    def test_ejected_after_errors(self):
+        self.router.probe_all()
+        self.down.add("b")
+        # b fails, the call goes on to the next fastest
+        self.assertEqual(self.router.call(self.node), "a")
+        self.assertEqual(self.ejected(), [])
+        self.assertEqual(self.router.call(self.node), "a")
+        self.assertEqual(self.ejected(), ["b"])
+        self.assertEqual(self.router.select()[-1].uri, "b")
+
+    def test_readmitted(self):
+        self.down.add("b")
+        for _ in range(2):
+            self.router.probe_all()
+        self.assertEqual(self.ejected(), ["b"])
+        self.down.clear()
+        self.router.probe_all()
+        self.assertEqual(self.ejected(), [])
+        self.assertEqual(self.router.call(self.node), "b")
+
+    def test_all_down(self):
+        self.down.update(self.LATENCY)
+        with self.assertRaises(ConnectionError):
+            self.router.call(self.node)
+        self.router.probe_all()
+        self.assertFalse(self.router.is_healthy())
+        # ejected endpoints are still tried as last resort
+        self.down.clear()
+        self.assertEqual(self.router.call(self.node), "a")
+
+
+@override_settings(
+    ETH_NODE={
+        **settings.ETH_NODE,
+        "metrics": {**settings.ETH_NODE["metrics"], "endpoint": True},
+    }
+)
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user("user@example.com", "pw")
+
+    def test_scrape_anonymous(self):
+        self.assertEqual(self.client.get("/djweb3/metrics").status_code, 401)
+
+    def test_scrape_staff(self):
+        self.user.is_staff = True
+        self.client.force_authenticate(self.user)
+        # no sampling thread, the scrape renders the registry as is
+        with mock.patch.object(NodeCollector, "__init__", return_value=None):
+            response = self.client.get("/djweb3/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("ethnode_balance_cache_hits_total", response.content.decode())
+
+    def test_anonymous(self):
+        self.assertEqual(self.client.post("/djweb3/metrics/reset").status_code, 401)
+
+    def test_not_staff(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post("/djweb3/metrics/reset").status_code, 403)
+
+    def test_staff(self):
+        RPCStats.record("eth_blockNumber", 0.01, False)
+        self.user.is_staff = True
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.post("/djweb3/metrics/reset").status_code, 204)
+        self.assertEqual(RPCStats.snapshot(), {})
+
+
+class SignerRegistryTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        patcher = mock.patch("djweb3.utils.cache.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(
+            SignerRegistry, "signers", LRUCache(maxsize=2, ttl=60)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.accounts = [Account.create() for _ in range(3)]
+
+    def send(self, account):
+        """
+        @return: (method, params) of the request that reached the node
+        """
+        requests = []
+
+        def make_request(method, params):
+            requests.append((method, params))
+            return {"result": "0x" + "00" * 32}
+
+        # complete transaction: nothing to fill in from a node
+        SignerRegistry.middleware(make_request, Web3())(
+            "eth_sendTransaction",
+            [
+                {
+                    "from": account.address,
+                    "to": self.accounts[0].address,
+                    "value": 1,
+                    "gas": 21000,
+                    "gasPrice": 10**9,
+                    "nonce": 0,
+                    "chainId": 1,
+                }
+            ],
+        )
+        return requests[-1]
+
+    def test_signs(self):
+        account = EthNode.get_account(self.accounts[1].key.hex())
+        method, params = self.send(account)
+        self.assertEqual(method, "eth_sendRawTransaction")
+        self.assertEqual(Account.recover_transaction(params[0]), account.address)
+
+    def test_unknown_account(self):
+        self.assertEqual(self.send(self.accounts[1])[0], "eth_sendTransaction")
+
+    def test_expired(self):
+        SignerRegistry.add(self.accounts[1])
+        self.now = 59
+        self.assertEqual(self.send(self.accounts[1])[0], "eth_sendRawTransaction")
+        self.now = 60
+        self.assertEqual(self.send(self.accounts[1])[0], "eth_sendTransaction")
+
+    def test_least_recently_used_evicted(self):
+        for account in self.accounts:
+            SignerRegistry.add(account)
+        self.assertEqual(SignerRegistry.info()["size"], 2)
+        self.assertEqual(self.send(self.accounts[0])[0], "eth_sendTransaction")
+        self.assertEqual(self.send(self.accounts[2])[0], "eth_sendRawTransaction")
+
+
+class TimingTest(SimpleTestCase):
+    def test_reconnect_wraps_once(self):
+        # fired on every reconnection, e.g. once per request with CONN_MAX_AGE=0
+        for _ in range(3):
+            connection_created.send(sender=type(connection), connection=connection)
+        self.assertEqual(connection.execute_wrappers.count(Timing.db_wrapper), 1)
+
+
+class CatalogTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        os.makedirs(self.path("data/keystore"))
+        os.makedirs(self.path("tmp"))
+        self.catalog = Catalog(
+            self.path("data/keystore"), self.path("tmp/keystore.catalog.json")
+        )
+
+    def path(self, *parts):
+        return os.path.join(self.tmp.name, *parts)
+
+    def write(self, basename, keyfile=None):
+        with open(self.path("data/keystore", basename), "w") as fd:
+            json.dump(keyfile or {}, fd)
+
+    def test_exists(self):
+        address = Account.create().address
+        self.write("UTC--2024-01-01T00-00-00.000000000Z--%s" % address[2:].lower())
+        self.assertTrue(self.catalog.exists(address))
+        self.assertTrue(self.catalog.exists(address[2:].upper()))
+        self.assertFalse(self.catalog.exists(Account.create().address))
+
+    def test_bad_entries_skipped(self):
+        address = Account.create().address
+        self.write("partial-copy", {"crypto": {}})
+        with open(self.path("data/keystore", "not-json"), "w") as fd:
+            fd.write("{")
+        self.write("key.json", {"address": address[2:]})
+        self.assertEqual(self.catalog.addresses(), [address[2:].lower()])
+
+    def test_add(self):
+        address = Account.create().address[2:].lower()
+        self.catalog.refresh()
+        mtime = os.stat(self.catalog.directory).st_mtime_ns
+        self.write("UTC--2024-01-01T00-00-00.000000000Z--%s" % address)
+        self.catalog.add("UTC--2024-01-01T00-00-00.000000000Z--%s" % address, mtime)
+        self.assertTrue(self.catalog.exists(address))
+        self.assertEqual(self.catalog.latest(), address)
+
+
+class PlanTest(SimpleTestCase):
+    def setUp(self):
+        self.started = []
+        self.lock = threading.Lock()
+
+    def step(self, name, fail=False):
+        def fn():
+            with self.lock:
+                self.started.append(name)
+            if fail:
+                raise RuntimeError(name)
+
+        return fn
+
+    def test_order(self):
+        plan = (
+            Plan("test")
+            .add("c", self.step("c"), after=("a", "b"))
+            .add("a", self.step("a"))
+            .add("b", self.step("b"), after=("a",))
+            .add("d", self.step("d"))
+        )
+        timings = plan.run()
+        self.assertEqual(set(timings), {"a", "b", "c", "d"})
+        for before, after in (("a", "b"), ("b", "c")):
+            self.assertLess(self.started.index(before), self.started.index(after))
+            self.assertLessEqual(timings[before][1], timings[after][0])
+
+    def test_failure_stops_dependents(self):
+        plan = (
+            Plan("test")
+            .add("a", self.step("a", fail=True))
+            .add("b", self.step("b"), after=("a",))
+            .add("c", self.step("c"), after=("b",))
+        )
+        with self.assertRaises(RuntimeError):
+            plan.run()
+        self.assertEqual(self.started, ["a"])
+
+    def test_cycle(self):
+        plan = (
+            Plan("test")
+            .add("a", self.step("a"))
+            .add("b", self.step("b"), after=("a", "c"))
+            .add("c", self.step("c"), after=("b",))
+        )
+        with self.assertRaisesMessage(AssertionError, "Cyclic steps: b, c"):
+            plan.run()
+        self.assertEqual(self.started, [])
+
+    def test_unknown_dependency(self):
+        plan = Plan("test").add("a", self.step("a"), after=("missing",))
+        with self.assertRaisesMessage(AssertionError, "a: unknown step missing"):
+            plan.run()
+        self.assertEqual(self.started, [])
+
+
+class ReadinessTest(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def later(self, fn, *args):
+        timer = threading.Timer(0.1, fn, args)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_deadline(self):
+        now = [0.0]
+        with mock.patch("djweb3.utils.cli.readiness.monotonic", lambda: now[0]):
+            deadline = Deadline(10, "node")
+            self.assertEqual(deadline.remaining(), 10)
+            self.assertEqual(deadline.remaining(2.0), 2.0)
+            now[0] = 9.5
+            self.assertEqual(deadline.remaining(2.0), 0.5)
+            now[0] = 10
+            with self.assertRaisesMessage(TimeoutError, "node not ready in time"):
+                deadline.remaining(2.0)
+        self.assertEqual(Deadline(None, "node").remaining(2.0), 2.0)
+
+    def test_backoff(self):
+        delays = backoff(initial=0.5, factor=2, maximum=3.0)
+        self.assertEqual([next(delays) for _ in range(5)], [0.5, 1.0, 2.0, 3.0, 3.0])
+
+    def test_wait_file(self):
+        path = os.path.join(self.tmp.name, "missing/jwtsecret")
+
+        def create():
+            # the parent too: watched from the closest existing directory
+            os.makedirs(os.path.dirname(path))
+            open(path, "w").close()
+
+        self.later(create)
+        self.assertEqual(wait_path(path, timeout=5), ["jwtsecret"])
+
+    def test_wait_directory(self):
+        self.later(open(os.path.join(self.tmp.name, "key"), "w").close)
+        self.assertEqual(wait_path(self.tmp.name, timeout=5), ["key"])
+
+    def test_wait_path_timeout(self):
+        with self.assertRaises(TimeoutError):
+            wait_path(os.path.join(self.tmp.name, "missing"), timeout=0.2)
+
+    def test_wait_port(self):
+        server = socket.socket()
+        self.addCleanup(server.close)
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+        self.later(server.listen)
+        self.assertTrue(wait_port("127.0.0.1", port, timeout=5))
+
+    def test_wait_port_timeout(self):
+        with self.assertRaises(TimeoutError):
+            wait_port("127.0.0.1", 1, timeout=0.2)
+
+
+class RPCStatsTest(SimpleTestCase):
+    def setUp(self):
+        RPCStats.reset()
+
+    def test_ended_threads_folded(self):
+        for i in range(20):
+            thread = threading.Thread(
+                target=RPCStats.record, args=("eth_call", 0.01, i % 2 == 0)
+            )
+            thread.start()
+            thread.join()
+        RPCStats.record("eth_call", 0.01, False)
+        calls, errors, _, counts = RPCStats.snapshot()[("eth_call", "-")]
+        self.assertEqual((calls, errors, counts[-1]), (21, 10, 21))
+        # the current thread's table only, the others merged
+        self.assertEqual(len(RPCStats._RPCStats__tables), 1)
+
+    def test_reset(self):
+        RPCStats.record("eth_call", 0.01, False)
+        RPCStats.reset()
+        self.assertEqual(RPCStats.snapshot(), {})
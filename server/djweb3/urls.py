@@ -0,0 +1,10 @@
+from django.urls import path
+from djweb3.views import metrics, metrics_reset, slow_requests
+
+app_name = "djweb3"
+
+urlpatterns = [
+    path("metrics", metrics),
+    path("metrics/reset", metrics_reset),
+    path("timing/slow", slow_requests),
+]
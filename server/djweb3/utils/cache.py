@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe mapping with least-recently-used eviction and hit/miss counters
+    """
+
+    MISSING = object()
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        @param ttl: seconds an entry stays valid after being set, forever if None
+        """
+        assert maxsize > 0, "maxsize must be positive"
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # {key: (value, expiry time)}
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self.__lock:
+            try:
+                value, expires = self.__data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= monotonic():
+                del self.__data[key]
+                self.misses += 1
+                return default
+            self.__data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else monotonic() + self.ttl
+        with self.__lock:
+            self.__data[key] = (value, expires)
+            self.__data.move_to_end(key)
+            while len(self.__data) > self.maxsize:
+                self.__data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.__lock:
+            found = self.__data.pop(key, None)
+            return default if found is None else found[0]
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+
+    def info(self):
+        with self.__lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.__data),
+                "maxsize": self.maxsize,
+            }
+
+    def __len__(self):
+        return len(self.__data)
@@ -2,27 +2,24 @@ import functools
 import json
 import hashlib
 import os
-from time import sleep
 import functools
 import subprocess
 import yaml
 
 from djweb3.utils.event import LOG_SEPARATOR, Logger
+from djweb3.utils.cli.readiness import wait_path
 
 
-def wait_fd(path, interval=2, log=False):
-    Logger.info("WAIT  %s", path)
-    keys = []
-    if os.path.isfile(path):
-        keys = [path]
-    elif os.path.isdir(path):
-        keys = os.listdir(path)
-    if len(keys) == 0:
-        sleep(interval)
-        wait_fd(path)
-        return False
+def wait_fd(path, timeout=None, log=False):
+    """
+    Blocks until `path` is a file, a UNIX socket, or a non-empty directory
+    @param timeout: seconds, e.g. `ethnode --timeout`; no limit if None
+    @return: last basename found; raises `TimeoutError` after `timeout` seconds
+    """
+    Logger.info("wait", "file", path)
+    keys = wait_path(path, timeout=timeout)
     if log:
-        Logger.info("WAIT LOG  %s%s\n", keys[-1], LOG_SEPARATOR)
+        Logger.info("wait", "log", "%s%s\n" % (keys[-1], LOG_SEPARATOR))
     return keys[-1]
 
 
@@ -0,0 +1,148 @@
+import os
+import threading
+
+from djweb3.utils.cli.common import dump_json, load_json
+from djweb3.utils.event import Logger
+
+
+class Catalog:
+    """
+    Index of a keystore directory: address, file, mtime and creation order.
+
+    Persisted next to the keystore, and refreshed only when the directory
+    mtime moves, parsing the new files only.
+    """
+
+    __registry = {}
+    __registry_lock = threading.Lock()
+
+    def __init__(self, directory, filename):
+        self.directory = directory
+        self.filename = filename
+        # directory mtime (ns) at the last refresh
+        self.mtime = None
+        # {basename: {"address": ..., "mtime": ..., "order": ...}}
+        self.entries = {}
+        self.order = 0
+        # {address: basename}
+        self.__addresses = {}
+        self.__lock = threading.Lock()
+        self.load()
+
+    @classmethod
+    def get(cls, path):
+        """
+        @param path: signer path, e.g. `Path.signer`
+        """
+        directory = path("data/keystore")
+        with cls.__registry_lock:
+            if directory not in cls.__registry:
+                cls.__registry[directory] = Catalog(
+                    directory, path("tmp/keystore.catalog.json")
+                )
+            return cls.__registry[directory]
+
+    def load(self):
+        try:
+            found = load_json(self.filename)
+            self.mtime = found["mtime"]
+            self.entries = found["entries"]
+            self.order = found["order"]
+        except (OSError, ValueError, KeyError):
+            self.mtime, self.entries, self.order = None, {}, 0
+        self.index()
+
+    def dump(self):
+        dump_json(
+            {"mtime": self.mtime, "entries": self.entries, "order": self.order},
+            self.filename,
+        )
+
+    def index(self):
+        self.__addresses = {
+            entry["address"]: basename for basename, entry in self.entries.items()
+        }
+
+    def refresh(self):
+        with self.__lock:
+            mtime = os.stat(self.directory).st_mtime_ns
+            if mtime == self.mtime:
+                return
+
+            found = set(os.listdir(self.directory))
+            for basename in set(self.entries) - found:
+                del self.entries[basename]
+            added = [
+                (os.stat(os.path.join(self.directory, basename)).st_mtime_ns, basename)
+                for basename in found - set(self.entries)
+            ]
+            # same mtime: geth names start with the creation time
+            for file_mtime, basename in sorted(added):
+                try:
+                    address = self.parse_address(basename)
+                except (OSError, ValueError, KeyError, AttributeError) as e:
+                    # not a keystore, e.g. a partial copy: read again on the
+                    # next refresh
+                    Logger.info("skip", "keystore", "%s  %s" % (basename, e))
+                    continue
+                self.entries[basename] = {
+                    "address": address,
+                    "mtime": file_mtime,
+                    "order": self.order,
+                }
+                self.order += 1
+
+            self.mtime = mtime
+            self.index()
+            if os.path.isdir(os.path.dirname(self.filename)):
+                self.dump()
+
+    def parse_address(self, basename):
+        """
+        @return: lowercase hex address, without 0x prefix
+        """
+        # geth: UTC--<time>--<address>
+        address = basename.rsplit("--", 1)[-1].lower()
+        if len(address) == 40:
+            return address
+        return load_json(os.path.join(self.directory, basename))["address"].lower()
+
+    def addresses(self):
+        """
+        @return: addresses, oldest first
+        """
+        self.refresh()
+        return [
+            entry["address"]
+            for entry in sorted(self.entries.values(), key=lambda e: e["order"])
+        ]
+
+    def latest(self):
+        self.refresh()
+        if len(self.entries) == 0:
+            return None
+        return max(self.entries.values(), key=lambda e: e["order"])["address"]
+
+    def exists(self, address):
+        """
+        @param address: with or without 0x prefix, any case
+        """
+        self.refresh()
+        return address.lower().removeprefix("0x") in self.__addresses
+
+    def add(self, basename, mtime):
+        """
+        Record a file this process wrote, without listing the directory again
+        @param mtime: directory mtime (ns) before the file was written
+        """
+        with self.__lock:
+            self.entries[basename] = {
+                "address": self.parse_address(basename),
+                "mtime": os.stat(os.path.join(self.directory, basename)).st_mtime_ns,
+                "order": self.order,
+            }
+            self.order += 1
+            self.__addresses[self.entries[basename]["address"]] = basename
+            if mtime == self.mtime:
+                # nothing else changed since the last refresh
+                self.mtime = os.stat(self.directory).st_mtime_ns
@@ -0,0 +1,90 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter
+
+from djweb3.utils.event import Logger
+
+
+class Plan:
+    """
+    Dependency graph of setup steps: a step starts as soon as the steps it
+    depends on are done, independent steps run concurrently.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        # {step: (function, dependencies)}
+        self.steps = {}
+        # {step: (start, end)}, seconds since the plan started
+        self.timings = {}
+
+    def add(self, name, fn, after=()):
+        assert name not in self.steps, "Step %s already planned" % name
+        self.steps[name] = (fn, tuple(after))
+        return self
+
+    def validate(self):
+        for name, (_, after) in self.steps.items():
+            for dependency in after:
+                assert dependency in self.steps, "%s: unknown step %s" % (
+                    name,
+                    dependency,
+                )
+        # Kahn: every step must be reachable without going round a cycle
+        done, pending = set(), set(self.steps)
+        while pending:
+            ready = {name for name in pending if set(self.steps[name][1]) <= done}
+            assert ready, "Cyclic steps: %s" % ", ".join(sorted(pending))
+            done |= ready
+            pending -= ready
+
+    def run(self, workers=None):
+        self.validate()
+        self.timings = {}
+        origin = perf_counter()
+
+        def timed(name):
+            start = perf_counter() - origin
+            self.steps[name][0]()
+            self.timings[name] = (start, perf_counter() - origin)
+
+        done, running = set(), {}
+        with ThreadPoolExecutor(max_workers=workers or len(self.steps)) as pool:
+            while len(done) != len(self.steps):
+                for name, (_, after) in self.steps.items():
+                    if name not in done and name not in running.values():
+                        if set(after) <= done:
+                            running[pool.submit(timed, name)] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    # the steps depending on a failed one are not started
+                    future.result()
+                    done.add(name)
+        return self.timings
+
+    def critical_path(self):
+        """
+        @return: the chain of steps that determined the total duration, first to last
+        """
+        if len(self.timings) == 0:
+            return []
+        path = [max(self.timings, key=lambda name: self.timings[name][1])]
+        while self.steps[path[-1]][1]:
+            path.append(
+                max(self.steps[path[-1]][1], key=lambda name: self.timings[name][1])
+            )
+        return path[::-1]
+
+    def report(self):
+        for name, (start, end) in sorted(self.timings.items(), key=lambda i: i[1]):
+            Logger.info(
+                "timing",
+                self.name,
+                "%-12s %7.2fs -> %7.2fs  %7.2fs" % (name, start, end, end - start),
+            )
+        path = self.critical_path()
+        Logger.info(
+            "critical path",
+            self.name,
+            "%s  %.2fs" % (" -> ".join(path), self.timings[path[-1]][1] if path else 0),
+        )
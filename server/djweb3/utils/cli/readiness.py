@@ -0,0 +1,217 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import socket
+import stat
+import requests
+from time import monotonic, sleep
+
+from djweb3.utils.event import Logger
+
+# inotify(7)
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_WATCH = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def backoff(initial=0.05, factor=2, maximum=2.0):
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
+class Deadline:
+    def __init__(self, timeout, what):
+        self.what = what
+        self.at = None if timeout is None else monotonic() + timeout
+
+    def remaining(self, cap=None):
+        """
+        @return: seconds left, at most `cap`; raises once the deadline passed
+        """
+        if self.at is None:
+            return cap
+        remaining = self.at - monotonic()
+        if remaining <= 0:
+            raise TimeoutError("%s not ready in time" % self.what)
+        return remaining if cap is None else min(remaining, cap)
+
+
+class Watcher:
+    """
+    inotify watch on one directory at a time, Linux only
+    """
+
+    libc = None
+
+    def __init__(self):
+        if Watcher.libc is None:
+            Watcher.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = Watcher.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.directory = None
+        self.wd = None
+
+    @classmethod
+    def create(cls):
+        """
+        @return: a watcher, or None where inotify is not available
+        """
+        try:
+            return cls()
+        except (OSError, AttributeError, TypeError):
+            return None
+
+    def watch(self, directory):
+        if directory == self.directory:
+            return
+        if self.wd is not None:
+            Watcher.libc.inotify_rm_watch(self.fd, self.wd)
+        self.wd = Watcher.libc.inotify_add_watch(self.fd, directory.encode(), IN_WATCH)
+        self.directory = directory if self.wd >= 0 else None
+        if self.wd < 0:
+            self.wd = None
+            raise OSError(ctypes.get_errno(), "inotify_add_watch", directory)
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                # the event itself does not matter, the path is checked again
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+def existing_parent(path):
+    parent = os.path.dirname(os.path.abspath(path))
+    while not os.path.isdir(parent):
+        parent = os.path.dirname(parent)
+    return parent
+
+
+def is_socket(path):
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def wait_path(path, timeout=None):
+    """
+    Blocks until `path` is a file, a UNIX socket, or a non-empty directory.
+    A socket may exist before it accepts connections, see `wait_ipc`.
+    Woken up by inotify as soon as it changes, polled with backoff otherwise.
+
+    @return: found basenames, e.g. [basename] for a file
+    """
+    deadline = Deadline(timeout, path)
+    delays = backoff()
+    watcher = Watcher.create()
+    try:
+        while True:
+            if os.path.isfile(path) or is_socket(path):
+                return [os.path.basename(path)]
+            if os.path.isdir(path) and len(os.listdir(path)) != 0:
+                return sorted(os.listdir(path))
+
+            if watcher is None:
+                sleep(deadline.remaining(next(delays)))
+                continue
+            try:
+                watcher.watch(path if os.path.isdir(path) else existing_parent(path))
+            except OSError:
+                # e.g. removed in between, or out of watches
+                sleep(deadline.remaining(next(delays)))
+                continue
+            # capped: events on some filesystems (e.g. network) are not reported
+            watcher.wait(deadline.remaining(1.0))
+    finally:
+        if watcher is not None:
+            watcher.close()
+
+
+def wait_port(host, port, timeout=None):
+    """
+    Blocks until a TCP connection to `host:port` is accepted
+    """
+    deadline = Deadline(timeout, "%s:%s" % (host, port))
+    for delay in backoff():
+        try:
+            with socket.create_connection((host, int(port)), deadline.remaining(2.0)):
+                return True
+        except OSError:
+            sleep(deadline.remaining(delay))
+
+
+def wait_rpc(url, method, timeout=None):
+    """
+    Blocks until the JSON-RPC server at `url` answers `method`
+    """
+    deadline = Deadline(timeout, url)
+    for delay in backoff():
+        try:
+            response = requests.post(
+                url,
+                json={"jsonrpc": "2.0", "id": 1, "method": method, "params": []},
+                timeout=deadline.remaining(2.0),
+            )
+            if response.ok and "result" in response.json():
+                return True
+        except (requests.RequestException, ValueError):
+            pass
+        sleep(deadline.remaining(delay))
+
+
+def wait_ipc(path, method, timeout=None):
+    """
+    Blocks until the JSON-RPC server on the UNIX socket `path` answers `method`
+    """
+    deadline = Deadline(timeout, path)
+    request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": method, "params": []})
+    for delay in backoff():
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(deadline.remaining(2.0))
+                sock.connect(path)
+                sock.sendall(request.encode())
+                data = b""
+                while True:
+                    chunk = sock.recv(4096)
+                    if not chunk:
+                        raise ValueError("connection closed")
+                    data += chunk
+                    try:
+                        # no framing: the reply is complete once it parses
+                        reply = json.loads(data)
+                        break
+                    except ValueError:
+                        continue
+            if "result" in reply:
+                return True
+        except (OSError, ValueError):
+            pass
+        sleep(deadline.remaining(delay))
+
+
+def wait_services(services, timeout=None):
+    """
+    @param services: {name: (wait function, *args)}, waited for one after the other
+    under one overall deadline
+    """
+    deadline = Deadline(timeout, "services")
+    for name, (wait, *args) in services.items():
+        start = monotonic()
+        wait(*args, timeout=deadline.remaining())
+        Logger.info("ready", name, "%.2fs" % (monotonic() - start))
@@ -0,0 +1,169 @@
+import json
+import os
+import queue
+import subprocess
+import threading
+from web3 import IPCProvider
+
+from djweb3.utils.cli.common import cleanup_container, set_on
+from djweb3.utils.cli.readiness import wait_ipc
+from djweb3.utils.event import Logger
+from djweb3.utils.models import SingletonAbstract
+from djweb3.utils.validator import Validator
+
+
+class SignerSession(SingletonAbstract):
+    """
+    One clef process kept running for the signer operations of a run.
+
+    Accounts are created through clef's external API (`account_new`, over
+    IPC), the password prompts are answered on its stdio UI channel. The
+    other operations (`setpw`, `init`, `attest`) have no API: they are run
+    with `docker exec` in the session container, without starting a new one.
+    """
+
+    process = None
+
+    def __init__(self, **kwargs) -> None:
+        if SignerSession.process is not None and SignerSession.process.poll() is None:
+            return
+        self.path = kwargs["path"]
+        self.env = kwargs["env"]
+        self.cmd = kwargs["cmd"]
+        # seconds clef has to answer on its socket
+        self.timeout = kwargs.get("timeout")
+        self.name = "%s-session" % self.env["name"]
+        # passwords of the `account_new` calls in flight: the prompts are not
+        # answered in the calls order, the calls of a run share one password
+        self.passwords = queue.Queue()
+        self.start()
+
+    def start(self):
+        ipcpath = self.path("clef", os.path.basename(self.env["session"]["ipcpath"]))
+        if os.path.exists(ipcpath):
+            os.remove(ipcpath)
+        cleanup_container(self.name, cwd=self.cmd["cwd"])
+
+        SignerSession.process = subprocess.Popen(
+            [
+                *self.cmd["compose"],
+                "run",
+                "--rm",
+                "-T",
+                "--name",
+                self.name,
+                "signer",
+                " ".join(
+                    [
+                        *self.cmd["bin"],
+                        "--configdir",
+                        "/app/data",
+                        "--keystore",
+                        "/app/data/keystore",
+                        *set_on("--lightkdf", self.env["lightkdf"]),
+                        "--nousb",
+                        "--suppress-bootwarn",
+                        "--ipcpath",
+                        self.env["session"]["ipcpath"],
+                        "--stdio-ui",
+                    ]
+                ),
+            ],
+            cwd=self.cmd["cwd"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+        )
+        threading.Thread(target=self.serve_ui, name="clef-ui", daemon=True).start()
+        # the socket exists before clef serves it: wait for an answer
+        Logger.info("wait", "signer session", ipcpath)
+        wait_ipc(ipcpath, "account_version", timeout=self.timeout)
+        self.provider = IPCProvider(ipcpath, timeout=60)
+        Logger.info("start", "signer session", self.name)
+
+    @property
+    def entrypoint(self):
+        """
+        Replaces `docker-compose run` for the clef CLI commands of `Signer`
+        """
+        return ["docker", "exec", "-i", self.name, "sh", "-c"]
+
+    def serve_ui(self):
+        """
+        Answers clef's UI requests, one JSON-RPC message per line on stdio
+        """
+        for line in SignerSession.process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if "id" not in message:
+                # notification, e.g. ui_showInfo
+                if message.get("method") == "ui_showError":
+                    Logger.info("error", "signer session", message.get("params"))
+                continue
+            try:
+                result = self.answer(message["method"], message["params"])
+            except queue.Empty:
+                # a prompt no `account_new` call is waiting for: clef gets an
+                # error, this thread keeps serving
+                Logger.info("error", "signer session", "unexpected %s" % message)
+                self.reply_error(message["id"], "no password available")
+                continue
+            self.reply(message["id"], result)
+
+    def answer(self, method, params):
+        if method == "ui_onInputRequired":
+            if "master" in params[0].get("title", "").lower():
+                return {"text": self.env["master_password"]}
+            return {"text": self.passwords.get(timeout=60)}
+        if method == "ui_approveNewAccount":
+            return {"approved": True}
+        if method == "ui_approveListing":
+            return {"accounts": params[0]["accounts"]}
+        # transactions and data signing are left to the rules (rules.js)
+        return {"approved": False}
+
+    def reply(self, id, result):
+        SignerSession.process.stdin.write(
+            json.dumps({"jsonrpc": "2.0", "id": id, "result": result}) + "\n"
+        )
+        SignerSession.process.stdin.flush()
+
+    def reply_error(self, id, message):
+        SignerSession.process.stdin.write(
+            json.dumps(
+                {
+                    "jsonrpc": "2.0",
+                    "id": id,
+                    "error": {"code": -32000, "message": message},
+                }
+            )
+            + "\n"
+        )
+        SignerSession.process.stdin.flush()
+
+    def newaccount(self, user_pwd):
+        """
+        Concurrent calls run their KDF concurrently in clef; they must share
+        `user_pwd`, whichever prompt comes first gets the first password
+
+        @return: address of the new account, lowercase without 0x prefix
+        """
+        if Validator.password(user_pwd):
+            self.passwords.put(user_pwd)
+            response = self.provider.make_request("account_new", [])
+            if "error" in response:
+                raise subprocess.CalledProcessError(
+                    1, "account_new", output=response["error"]
+                )
+            return response["result"].lower().removeprefix("0x")
+
+    def stop(self):
+        if SignerSession.process is not None:
+            SignerSession.process.terminate()
+            SignerSession.process.wait()
+            SignerSession.process = None
+            Logger.info("stop", "signer session", self.name)
@@ -1,9 +1,10 @@
 import os
 import subprocess
 
+from djweb3.utils.cli.keystore import Catalog
 from djweb3.utils.mapper import Mapper
 from djweb3.utils.models import SingletonAbstract
-from djweb3.utils import load_json, sha256sum, touch, Logger
+from djweb3.utils import set_on, sha256sum, touch, Logger
 from djweb3.utils.validator import Validator
 
 
@@ -92,6 +93,8 @@ class Signer(SingletonAbstract):
     def newaccount(cls, *args, **kwargs):
         # Create account and Generate keystore (with the account password)
         user_pwd = args[0]
+        if kwargs.get("session") is not None:
+            return kwargs["session"].newaccount(user_pwd)
         if Validator.password(user_pwd):
             subprocess.check_call(
                 [
@@ -103,7 +106,7 @@ class Signer(SingletonAbstract):
                             "/app/data/keystore",
                             "--stdio-ui",
                             "newaccount",
-                            "--lightkdf",
+                            *set_on("--lightkdf", kwargs["env"]["lightkdf"]),
                             ">/dev/null 2>&1 << EOF\n%sEOF"
                             % ("{0}\n" * 1).format(user_pwd),
                         ]
@@ -117,7 +120,9 @@ class Signer(SingletonAbstract):
     def setpw(cls, *args, **kwargs):
         # Store a credential for the generated keystore file
         user_pwd, master_pwd = args
-        latest_wallet_address_eth = cls.get_wallet_address_eth(kwargs["path"])[-1]
+        latest_wallet_address_eth = kwargs.get("address") or (
+            Catalog.get(kwargs["path"]).latest()
+        )
         if Validator.password(user_pwd):
             subprocess.check_call(
                 [
@@ -146,15 +151,18 @@ class Signer(SingletonAbstract):
 
     @classmethod
     def get_wallet_address_eth(cls, path):
+        """
+        @return: addresses of the keystore, oldest first
+        """
         try:
-            found = os.listdir(path("data/keystore"))
-            return [
-                load_json(path("data/keystore", basename))["address"]
-                for basename in found
-            ]
-        except (IndexError, KeyError) as e:
+            return Catalog.get(path).addresses()
+        except (OSError, KeyError) as e:
             Logger.error("account not found  %s", e)
 
+    @classmethod
+    def has_wallet_address_eth(cls, path, address):
+        return Catalog.get(path).exists(address)
+
     @property
     def sha256sum_rules_js(self):
         try:
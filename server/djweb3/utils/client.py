@@ -0,0 +1,189 @@
+import os
+import threading
+from time import monotonic
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from django.conf import settings
+
+from djweb3.utils.exception import ConnectionError
+from djweb3.utils.instrument import RPCStats
+from djweb3.utils.signing import SignerRegistry
+from djweb3.utils import tester
+
+
+class PooledHTTPProvider(Web3.HTTPProvider):
+    """
+    HTTP provider sending every request through one keep-alive session
+
+    web3 keeps a session per thread, so a pool is not shared between workers
+    and its size/timeouts cannot be set once for the whole process.
+    """
+
+    def __init__(self, endpoint_uri, session, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self.session = session
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        response = self.session.post(
+            self.endpoint_uri, data=request_data, **self.get_request_kwargs()
+        )
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+
+class LockedWebsocketProvider(Web3.WebsocketProvider):
+    """
+    Persistent WebSocket provider, safe to share between threads
+
+    Requests on the socket are not tagged by caller, a request and its
+    response must not interleave with those of another thread.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__lock = threading.Lock()
+
+    def make_request(self, method, params):
+        with self.__lock:
+            return super().make_request(method, params)
+
+
+class Client:
+    """
+    Long-lived connection to a node, shared by every thread of the process
+    """
+
+    TRANSPORTS = ("ipc", "ws", "http")
+
+    __registry = {}
+    # {endpoint: monotonic time of the last failed connection}
+    __failures = {}
+    __lock = threading.Lock()
+
+    def __init__(self, endpoint):
+        options = settings.ETH_NODE["client"]
+        self.endpoint = endpoint
+        self.timeout = options["timeout"]
+        self.transport = Client.get_transport(endpoint)
+        # HTTP only
+        self.session = None
+
+        if self.transport == "http":
+            self.session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=options["pool_size"])
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            provider = PooledHTTPProvider(
+                endpoint,
+                self.session,
+                request_kwargs={"timeout": self.timeout},
+            )
+        elif self.transport == "tester":
+            provider = tester.Tester.provider()
+        elif self.transport == "ws":
+            provider = LockedWebsocketProvider(
+                endpoint, websocket_timeout=self.timeout[1]
+            )
+        else:
+            provider = Web3.IPCProvider(endpoint, timeout=self.timeout[1])
+        self.w3 = Web3(provider)
+        # signs the transactions sent from an account of `EthNode.get_account`
+        self.w3.middleware_onion.add(SignerRegistry.middleware, "signers")
+        # innermost: times the round trip to the node only
+        self.w3.middleware_onion.inject(RPCStats.middleware, "rpc_stats", layer=0)
+
+    @classmethod
+    def get_transport(cls, endpoint):
+        if endpoint == tester.ENDPOINT:
+            return "tester"
+        if endpoint.startswith(("http://", "https://")):
+            return "http"
+        if endpoint.startswith(("ws://", "wss://")):
+            return "ws"
+        return "ipc"
+
+    @classmethod
+    def endpoints(cls, transport=None):
+        """
+        Endpoints of the node for `transport`, `ETH_NODE["transport"]` by default
+
+        `auto`: one endpoint per node, the router only fails over to another
+        node. The first node is reached over its IPC socket when Django runs
+        next to geth, else over its persistent WebSocket, else over HTTP; the
+        other replicas over HTTP.
+
+        The in-process chain only, whatever the transport, when
+        `ETH_NODE["backend"]` is `tester`.
+        """
+        if settings.ETH_NODE["backend"] == "tester":
+            return [tester.ENDPOINT]
+        transport = transport or settings.ETH_NODE["transport"]
+        assert transport in ("auto", *cls.TRANSPORTS), (
+            "Unknown transport %s" % transport
+        )
+        found = {
+            "ipc": (
+                [settings.ETH_NODE["ipc_address"]]
+                if settings.ETH_NODE["ipc_address"]
+                and os.path.exists(settings.ETH_NODE["ipc_address"])
+                else []
+            ),
+            "ws": (
+                [settings.ETH_NODE["ws_address"]]
+                if settings.ETH_NODE["ws_address"]
+                else []
+            ),
+            "http": list(settings.ETH_NODE["address"]),
+        }
+        if transport == "auto":
+            first = (found["ipc"] or found["ws"] or found["http"])[:1]
+            return [*first, *found["http"][1:]]
+        return found[transport]
+
+    @classmethod
+    def get(cls, endpoint):
+        """
+        Client of `endpoint`, connected and health checked on first use only
+
+        A failed endpoint is not tried again for `retry_after` seconds, the
+        callers fail fast instead of each waiting for the connect timeout.
+        """
+        client = cls.__registry.get(endpoint)
+        if client is not None:
+            return client
+
+        failed_at = cls.__failures.get(endpoint)
+        if (
+            failed_at is not None
+            and monotonic() - failed_at < settings.ETH_NODE["client"]["retry_after"]
+        ):
+            raise ConnectionError(endpoint)
+
+        # probed without the lock: a slow node does not hold the other ones
+        client = Client(endpoint)
+        if not client.w3.is_connected():
+            client.disconnect()
+            cls.__failures[endpoint] = monotonic()
+            raise ConnectionError(endpoint)
+
+        with cls.__lock:
+            # another thread may have connected meanwhile, keep its client
+            registered = cls.__registry.setdefault(endpoint, client)
+            cls.__failures.pop(endpoint, None)
+        if registered is not client:
+            client.disconnect()
+        return registered
+
+    def disconnect(self):
+        if self.session is not None:
+            self.session.close()
+
+    @classmethod
+    def close(cls):
+        with cls.__lock:
+            for client in cls.__registry.values():
+                client.disconnect()
+            cls.__registry.clear()
+            cls.__failures.clear()
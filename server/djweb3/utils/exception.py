@@ -2,3 +2,9 @@ class ConnectionError(Exception):
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
         self.message = "Connection to Ethereum node failed!"
+
+
+class RPCError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)
+        self.message = "Ethereum node returned an error!"
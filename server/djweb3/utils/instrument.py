@@ -0,0 +1,175 @@
+import contextvars
+import threading
+from time import perf_counter
+
+from djweb3.utils.metrics import REGISTRY, Histogram, format_labels, format_value
+from djweb3.utils.timing import Timing
+
+
+class RPCStats:
+    """
+    Calls, errors and latency of the JSON-RPC requests, per method and view
+
+    Every thread counts in its own table, written by that thread only: no
+    lock on the request path. Readers merge the tables of all the threads;
+    those of the threads that ended are folded into one.
+    """
+
+    BUCKETS = (*Histogram.BUCKETS, float("inf"))
+    LABELS = ("method", "view")
+
+    # view of the request being served, set by `djweb3.middleware`
+    view = contextvars.ContextVar("djweb3_view", default="-")
+
+    # bumped by `reset`, tables of an older generation are dropped
+    generation = 0
+    __local = threading.local()
+    # {thread: its table}, live threads only
+    __tables = {}
+    # counters of the threads that ended, merged
+    __retired = {}
+    __lock = threading.Lock()
+
+    @classmethod
+    def table(cls):
+        local = cls.__local
+        if getattr(local, "generation", None) != cls.generation:
+            # {(method, view): [calls, errors, latency sum, bucket counts]}
+            local.counters = {}
+            local.generation = cls.generation
+            # once per thread and reset, not per call
+            with cls.__lock:
+                cls.__fold()
+                cls.__tables[threading.current_thread()] = local.__dict__
+        return local.counters
+
+    @classmethod
+    def __fold(cls):
+        # a thread per request (runserver, `sync_to_async`): the tables would
+        # grow without bound
+        for thread, table in list(cls.__tables.items()):
+            if not thread.is_alive():
+                del cls.__tables[thread]
+                if table["generation"] == cls.generation:
+                    cls.merge(cls.__retired, table["counters"])
+
+    @classmethod
+    def merge(cls, merged, counters):
+        for key, (calls, errors, total, counts) in list(counters.items()):
+            entry = merged.setdefault(key, [0, 0, 0.0, [0] * len(cls.BUCKETS)])
+            entry[0] += calls
+            entry[1] += errors
+            entry[2] += total
+            entry[3] = [a + b for a, b in zip(entry[3], counts)]
+
+    @classmethod
+    def record(cls, method, elapsed, error):
+        Timing.add("rpc", elapsed)
+        key = (method, cls.view.get())
+        counters = cls.table()
+        entry = counters.get(key)
+        if entry is None:
+            entry = counters[key] = [0, 0, 0.0, [0] * len(cls.BUCKETS)]
+        entry[0] += 1
+        entry[1] += int(error)
+        entry[2] += elapsed
+        for i, bound in enumerate(cls.BUCKETS):
+            if elapsed <= bound:
+                entry[3][i] += 1
+
+    @classmethod
+    def snapshot(cls):
+        """
+        @return: {(method, view): [calls, errors, latency sum, bucket counts]}
+        """
+        merged = {}
+        with cls.__lock:
+            cls.__fold()
+            cls.merge(merged, cls.__retired)
+            tables = [
+                dict(table["counters"])
+                for table in cls.__tables.values()
+                if table["generation"] == cls.generation
+            ]
+        for counters in tables:
+            cls.merge(merged, counters)
+        return merged
+
+    @classmethod
+    def reset(cls):
+        with cls.__lock:
+            cls.generation += 1
+            cls.__tables.clear()
+            cls.__retired.clear()
+
+    @classmethod
+    def render(cls):
+        """
+        @return: Prometheus text lines, rendered with `REGISTRY`
+        """
+        snapshot = sorted(cls.snapshot().items())
+        lines = [
+            "# HELP ethnode_rpc_calls_total JSON-RPC requests sent by the server",
+            "# TYPE ethnode_rpc_calls_total counter",
+            *[
+                "ethnode_rpc_calls_total%s %d" % (format_labels(cls.LABELS, key), e[0])
+                for key, e in snapshot
+            ],
+            "# HELP ethnode_rpc_errors_total JSON-RPC requests failed or answered an error",
+            "# TYPE ethnode_rpc_errors_total counter",
+            *[
+                "ethnode_rpc_errors_total%s %d" % (format_labels(cls.LABELS, key), e[1])
+                for key, e in snapshot
+            ],
+            "# HELP ethnode_rpc_duration_seconds JSON-RPC round trip of the server requests",
+            "# TYPE ethnode_rpc_duration_seconds histogram",
+        ]
+        for key, (calls, errors, total, counts) in snapshot:
+            lines.extend(
+                "ethnode_rpc_duration_seconds_bucket%s %d"
+                % (
+                    format_labels((*cls.LABELS, "le"), (*key, format_value(bound))),
+                    count,
+                )
+                for bound, count in zip(cls.BUCKETS, counts)
+            )
+            lines.append(
+                "ethnode_rpc_duration_seconds_sum%s %r"
+                % (format_labels(cls.LABELS, key), total)
+            )
+            lines.append(
+                "ethnode_rpc_duration_seconds_count%s %d"
+                % (format_labels(cls.LABELS, key), calls)
+            )
+        return lines
+
+    @staticmethod
+    def middleware(make_request, w3):
+        def middleware(method, params):
+            start = perf_counter()
+            try:
+                response = make_request(method, params)
+            except Exception:
+                RPCStats.record(method, perf_counter() - start, True)
+                raise
+            RPCStats.record(method, perf_counter() - start, "error" in response)
+            return response
+
+        return middleware
+
+    @staticmethod
+    async def async_middleware(make_request, w3):
+        async def middleware(method, params):
+            start = perf_counter()
+            try:
+                response = await make_request(method, params)
+            except Exception:
+                RPCStats.record(method, perf_counter() - start, True)
+                raise
+            RPCStats.record(method, perf_counter() - start, "error" in response)
+            return response
+
+        return middleware
+
+
+REGISTRY.register(RPCStats)
@@ -0,0 +1,128 @@
+import math
+import threading
+
+
+def format_labels(names, values):
+    if len(names) == 0:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # {label values: sample}
+        self.samples = {}
+        self.lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def key(self, labels):
+        assert set(labels) == set(self.labels), "%s: labels are %s" % (
+            self.name,
+            self.labels,
+        )
+        return tuple(labels[name] for name in self.labels)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def render(self):
+        lines = [
+            "# HELP %s %s" % (self.name, self.help),
+            "# TYPE %s %s" % (self.name, self.type),
+        ]
+        with self.lock:
+            samples = dict(self.samples)
+        for key, value in sorted(samples.items()):
+            lines.extend(self.render_sample(key, value))
+        return lines
+
+    def render_sample(self, key, value):
+        return [
+            "%s%s %s"
+            % (self.name, format_labels(self.labels, key), format_value(value))
+        ]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.samples[self.key(labels)] = value
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, value=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    # seconds, suited to RPC round trips
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS, registry=None):
+        self.buckets = (*sorted(buckets), math.inf)
+        super().__init__(name, help, labels, registry)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.samples.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.samples[key] = (counts, total + value)
+
+    def render_sample(self, key, value):
+        counts, total = value
+        names = (*self.labels, "le")
+        return [
+            *[
+                "%s_bucket%s %d"
+                % (self.name, format_labels(names, (*key, format_value(bound))), count)
+                for bound, count in zip(self.buckets, counts)
+            ],
+            "%s_sum%s %s" % (self.name, format_labels(self.labels, key), repr(total)),
+            "%s_count%s %d" % (self.name, format_labels(self.labels, key), counts[-1]),
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def render(self):
+        """
+        @return: Prometheus text exposition format
+        """
+        return (
+            "\n".join(line for metric in self.metrics for line in metric.render())
+            + "\n"
+        )
+
+
+REGISTRY = Registry()
@@ -0,0 +1,144 @@
+import logging
+import threading
+from time import monotonic, sleep
+from django.conf import settings
+
+from djweb3.utils.exception import ConnectionError
+
+logger = logging.getLogger(__name__)
+
+# failures of the endpoint itself, as opposed to JSON-RPC errors
+TRANSPORT_ERRORS = (ConnectionError, OSError, TimeoutError)
+
+
+class Endpoint:
+    def __init__(self, uri):
+        self.uri = uri
+        # moving averages: seconds per call, ratio of failed calls
+        self.latency = None
+        self.error_rate = 0.0
+        self.ejected = False
+        self.__lock = threading.Lock()
+
+    def record(self, latency=None, error=False):
+        alpha = settings.ETH_NODE["router"]["alpha"]
+        with self.__lock:
+            self.error_rate = (1 - alpha) * self.error_rate + alpha * error
+            if latency is not None:
+                self.latency = (
+                    latency
+                    if self.latency is None
+                    else (1 - alpha) * self.latency + alpha * latency
+                )
+            ejected = self.error_rate >= settings.ETH_NODE["router"]["max_error_rate"]
+            if ejected != self.ejected:
+                logger.warning(
+                    "ENDPOINT %s  %s", "EJECTED" if ejected else "READMITTED", self.uri
+                )
+            self.ejected = ejected
+
+    def readmit(self, latency):
+        with self.__lock:
+            self.error_rate = 0.0
+        self.record(latency)
+
+    def info(self):
+        return {
+            "uri": self.uri,
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "ejected": self.ejected,
+        }
+
+
+class Router:
+    """
+    Spreads calls over several nodes: the fastest healthy endpoint is tried
+    first, and the next ones on transport failures. Failing endpoints are
+    ejected, then re-admitted once a background probe succeeds again.
+    """
+
+    def __init__(self, uris, probe):
+        """
+        @param probe: callable(uri), raises if the node is not usable
+        """
+        assert len(uris) != 0, "You must set at least one endpoint"
+        self.endpoints = [Endpoint(uri) for uri in uris]
+        self.probe = probe
+        threading.Thread(target=self.probe_forever, name="router", daemon=True).start()
+
+    @property
+    def uris(self):
+        return [endpoint.uri for endpoint in self.endpoints]
+
+    def select(self):
+        """
+        @return: healthy endpoints, fastest first; ejected ones only as last resort
+        """
+        return sorted(
+            self.endpoints,
+            key=lambda endpoint: (
+                endpoint.ejected,
+                # never measured, e.g. just configured: worth a try
+                endpoint.latency or 0.0,
+            ),
+        )
+
+    def call(self, fn):
+        """
+        @param fn: callable(uri)
+        """
+        error = None
+        for endpoint in self.select():
+            start = monotonic()
+            try:
+                result = fn(endpoint.uri)
+            except TRANSPORT_ERRORS as e:
+                endpoint.record(error=True)
+                error = e
+                continue
+            endpoint.record(monotonic() - start)
+            return result
+        raise ConnectionError(error)
+
+    async def acall(self, fn):
+        """
+        @param fn: coroutine function(uri)
+        """
+        error = None
+        for endpoint in self.select():
+            start = monotonic()
+            try:
+                result = await fn(endpoint.uri)
+            except TRANSPORT_ERRORS as e:
+                endpoint.record(error=True)
+                error = e
+                continue
+            endpoint.record(monotonic() - start)
+            return result
+        raise ConnectionError(error)
+
+    def is_healthy(self):
+        return any(not endpoint.ejected for endpoint in self.endpoints)
+
+    def probe_forever(self):
+        while True:
+            sleep(settings.ETH_NODE["router"]["probe_interval"])
+            self.probe_all()
+
+    def probe_all(self):
+        for endpoint in self.endpoints:
+            start = monotonic()
+            try:
+                self.probe(endpoint.uri)
+            except Exception:
+                endpoint.record(error=True)
+                continue
+            if endpoint.ejected:
+                endpoint.readmit(monotonic() - start)
+            else:
+                # keeps the latency of idle endpoints up to date
+                endpoint.record(monotonic() - start)
+
+    def info(self):
+        return [endpoint.info() for endpoint in self.endpoints]
@@ -0,0 +1,44 @@
+from django.conf import settings
+from web3.middleware.signing import construct_sign_and_send_raw_middleware
+
+from djweb3.utils.cache import LRUCache
+
+
+class SignerRegistry:
+    """
+    Local accounts allowed to sign, looked up per transaction by one middleware
+
+    Adding a signing middleware per account would grow the middleware stack
+    that every RPC call goes through, for as long as the process runs.
+    """
+
+    # {address: signing middleware}, bounded
+    signers = LRUCache(
+        settings.ETH_NODE["signers"]["maxsize"],
+        ttl=settings.ETH_NODE["signers"]["ttl"],
+    )
+
+    @classmethod
+    def add(cls, account):
+        cls.signers.set(
+            account.address.lower(), construct_sign_and_send_raw_middleware(account)
+        )
+
+    @classmethod
+    def remove(cls, address):
+        cls.signers.pop(address.lower())
+
+    @classmethod
+    def info(cls):
+        return cls.signers.info()
+
+    @staticmethod
+    def middleware(make_request, w3):
+        def middleware(method, params):
+            if method == "eth_sendTransaction" and params[0].get("from"):
+                signer = SignerRegistry.signers.get(str(params[0]["from"]).lower())
+                if signer is not LRUCache.MISSING:
+                    return signer(make_request, w3)(method, params)
+            return make_request(method, params)
+
+        return middleware
@@ -0,0 +1,107 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep
+
+
+class StandInNode:
+    """
+    Local JSON-RPC server answering like an execution client, with a fixed
+    latency per request: benchmarks measure the server, not the network.
+
+    Balances are derived from the address, the head moves every `block_time`.
+    """
+
+    def __init__(self, latency=0.0, block_time=12.0, addr="127.0.0.1", port=0):
+        """
+        @param latency: seconds slept before answering a request (a batch once)
+        @param port: 0 picks a free port
+        """
+        self.latency = latency
+        self.block_time = block_time
+        self.started = monotonic()
+        self.server = ThreadingHTTPServer((addr, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        return "http://%s:%s" % self.server.server_address[:2]
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="standin-node", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def block_number(self):
+        return 1 + int((monotonic() - self.started) / self.block_time)
+
+    def result(self, method, params):
+        if method == "eth_blockNumber":
+            return hex(self.block_number())
+        if method == "eth_getBalance":
+            # 0 to ~16.7 ether, stable per address
+            return hex(int(params[0][-6:], 16) * 10**12)
+        if method in ("eth_chainId", "net_version"):
+            return "0x539" if method == "eth_chainId" else "1337"
+        if method == "web3_clientVersion":
+            return "StandIn/v1"
+        if method == "eth_syncing":
+            return False
+        if method in ("net_peerCount", "eth_gasPrice", "eth_getTransactionCount"):
+            return "0x0"
+        return None
+
+    def reply(self, request):
+        if request.get("method") is None:
+            return {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "error": {"code": -32600, "message": "Invalid request"},
+            }
+        result = self.result(request["method"], request.get("params") or [])
+        if result is None:
+            return {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "error": {"code": -32601, "message": "Method not found"},
+            }
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    def handler(self):
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if node.latency:
+                    sleep(node.latency)
+                if isinstance(body, list):
+                    reply = [node.reply(request) for request in body]
+                else:
+                    reply = node.reply(body)
+                data = json.dumps(reply).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+from time import sleep
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from web3.providers.eth_tester import (
+    AsyncEthereumTesterProvider,
+    EthereumTesterProvider,
+)
+
+# `Client` endpoint of the in-process chain
+ENDPOINT = "tester://"
+
+
+def to_rpc(response):
+    # eth-tester answers with Python ints, a node with hex quantities
+    result = response.get("result")
+    if isinstance(result, int) and not isinstance(result, bool):
+        return {**response, "result": hex(result)}
+    return response
+
+
+class TesterProvider(EthereumTesterProvider):
+    """
+    In-process chain answering after `ETH_NODE["tester"]["latency"]` seconds
+    """
+
+    def __init__(self, ethereum_tester, lock):
+        super().__init__(ethereum_tester)
+        self.lock = lock
+
+    def make_request(self, method, params):
+        latency = settings.ETH_NODE["tester"]["latency"]
+        if latency:
+            sleep(latency)
+        # the chain is not thread safe
+        with self.lock:
+            return to_rpc(super().make_request(method, params))
+
+
+class AsyncTesterProvider(AsyncEthereumTesterProvider):
+    def __init__(self, ethereum_tester, lock):
+        super().__init__()
+        self.ethereum_tester = ethereum_tester
+        self.lock = lock
+
+    async def make_request(self, method, params):
+        latency = settings.ETH_NODE["tester"]["latency"]
+        if latency:
+            await asyncio.sleep(latency)
+        with self.lock:
+            return to_rpc(await super().make_request(method, params))
+
+
+class Tester:
+    """
+    In-memory chain shared by the process, `ETH_NODE["backend"] = "tester"`
+
+    Blocks are mined on every transaction, the accounts of `accounts()`
+    are funded at genesis.
+    """
+
+    chain = None
+    __lock = threading.Lock()
+    __chain_lock = threading.RLock()
+
+    @classmethod
+    def get(cls):
+        with cls.__lock:
+            if cls.chain is None:
+                try:
+                    from eth_tester import EthereumTester
+                except ImportError:
+                    raise ImproperlyConfigured(
+                        'ETH_NODE["backend"] = "tester" requires eth-tester, '
+                        'run `pip install "web3[tester]"`'
+                    )
+                cls.chain = EthereumTester()
+            return cls.chain
+
+    @classmethod
+    def provider(cls):
+        return TesterProvider(cls.get(), cls.__chain_lock)
+
+    @classmethod
+    def async_provider(cls):
+        return AsyncTesterProvider(cls.get(), cls.__chain_lock)
+
+    @classmethod
+    def accounts(cls):
+        return cls.get().get_accounts()
+
+    @classmethod
+    def fund(cls, address, wei):
+        """
+        Send `wei` from the first funded account, mined immediately
+        @return: transaction hash
+        """
+        chain = cls.get()
+        with cls.__chain_lock:
+            return chain.send_transaction(
+                {
+                    "from": chain.get_accounts()[0],
+                    "to": address,
+                    "value": wei,
+                    "gas": 21000,
+                }
+            )
@@ -0,0 +1,92 @@
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter, time
+from django.conf import settings
+
+
+class Timing:
+    """
+    Time spent per phase (db, rpc, auth, serialize) by the request being served
+
+    The phases are accumulated in a dict bound to the request's context, so
+    the threads of `sync_to_async` add to the same request.
+    """
+
+    PHASES = ("db", "rpc", "auth", "serialize")
+
+    # {phase: [seconds, count]}, None outside of a request
+    phases = contextvars.ContextVar("djweb3_timing", default=None)
+    # latest slow requests, oldest dropped
+    slow = deque(maxlen=settings.SERVER_TIMING["slow"]["size"])
+
+    @classmethod
+    def start(cls):
+        phases = {phase: [0.0, 0] for phase in cls.PHASES}
+        return phases, cls.phases.set(phases)
+
+    @classmethod
+    def stop(cls, token):
+        cls.phases.reset(token)
+
+    @classmethod
+    def add(cls, phase, elapsed):
+        phases = cls.phases.get()
+        if phases is not None:
+            entry = phases[phase]
+            entry[0] += elapsed
+            entry[1] += 1
+
+    @classmethod
+    @contextmanager
+    def measure(cls, phase):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            cls.add(phase, perf_counter() - start)
+
+    @classmethod
+    def db_wrapper(cls, execute, sql, params, many, context):
+        """
+        @see: `connection.execute_wrappers`
+        """
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            cls.add("db", perf_counter() - start)
+
+    @classmethod
+    def header(cls, phases, total):
+        """
+        @return: `Server-Timing` value, e.g. `db;dur=1.2;desc="3", total;dur=9.8`
+        """
+        return ", ".join(
+            [
+                '%s;dur=%.1f;desc="%d"' % (phase, elapsed * 1000, count)
+                for phase, (elapsed, count) in phases.items()
+                if count
+            ]
+            + ["total;dur=%.1f" % (total * 1000)]
+        )
+
+    @classmethod
+    def sample(cls, request, status, phases, total):
+        if total < settings.SERVER_TIMING["slow"]["threshold"]:
+            return
+        # deque.append is atomic, no lock needed
+        cls.slow.append(
+            {
+                "at": time(),
+                "method": request.method,
+                "path": request.path,
+                "view": getattr(request.resolver_match, "view_name", None),
+                "status": status,
+                "total_ms": round(total * 1000, 1),
+                "phases": {
+                    phase: {"ms": round(elapsed * 1000, 1), "count": count}
+                    for phase, (elapsed, count) in phases.items()
+                },
+            }
+        )
@@ -0,0 +1,56 @@
+import threading
+from collections import deque
+from eth_account import Account
+from django.conf import settings
+
+
+class WalletPool:
+    """
+    Keypairs generated ahead of time by a background thread, refilled up to
+    `size` whenever the pool drops to `low_water`. No node is involved.
+    """
+
+    __wallets = deque()
+    __refill = threading.Event()
+    __thread = None
+    __lock = threading.Lock()
+
+    @classmethod
+    def start(cls):
+        with cls.__lock:
+            if cls.__thread is None:
+                cls.__thread = threading.Thread(
+                    target=cls.fill_forever, name="wallet-pool", daemon=True
+                )
+                cls.__thread.start()
+                cls.__refill.set()
+
+    @classmethod
+    def take(cls):
+        """
+        @return: a new `LocalAccount`
+        """
+        cls.start()
+        try:
+            account = cls.__wallets.popleft()
+        except IndexError:
+            # drained by a burst, faster than waiting for the refill
+            account = Account.create()
+        if len(cls.__wallets) <= settings.ETH_NODE["wallet_pool"]["low_water"]:
+            cls.__refill.set()
+        return account
+
+    @classmethod
+    def fill_forever(cls):
+        while True:
+            cls.__refill.wait()
+            cls.__refill.clear()
+            while len(cls.__wallets) < settings.ETH_NODE["wallet_pool"]["size"]:
+                cls.__wallets.append(Account.create())
+
+    @classmethod
+    def info(cls):
+        return {
+            "size": len(cls.__wallets),
+            **settings.ETH_NODE["wallet_pool"],
+        }
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework import (
+    decorators as rest_decorators,
+    permissions as rest_permissions,
+    response,
+)
+
+from djweb3.collector import NodeCollector
+from djweb3.utils.instrument import RPCStats
+from djweb3.utils.metrics import REGISTRY
+from djweb3.utils.timing import Timing
+
+
+@rest_decorators.api_view(["GET"])
+@rest_decorators.permission_classes([rest_permissions.IsAdminUser])
+def metrics(request):
+    """
+    Prometheus scrape endpoint, enabled by `ETH_NODE["metrics"]["endpoint"]`
+
+    Admins only: the node endpoints and the traffic per view are not public.
+    Unauthenticated scrapers use `ethmetrics --port` on an internal interface.
+    """
+    if not settings.ETH_NODE["metrics"]["endpoint"]:
+        raise Http404()
+    # sampling runs in the background, a scrape only renders the last sample
+    NodeCollector()
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4")
+
+
+@rest_decorators.api_view(["POST"])
+@rest_decorators.permission_classes([rest_permissions.IsAdminUser])
+def metrics_reset(request):
+    """
+    Zeroes the JSON-RPC counters, e.g. between two benchmark runs
+    """
+    if not settings.ETH_NODE["metrics"]["endpoint"]:
+        raise Http404()
+    RPCStats.reset()
+    return response.Response(status=204)
+
+
+@rest_decorators.api_view(["GET"])
+@rest_decorators.permission_classes([rest_permissions.IsAdminUser])
+def slow_requests(request):
+    """
+    Latest requests slower than `SERVER_TIMING["slow"]["threshold"]`, newest first
+    """
+    return response.Response(list(reversed(Timing.slow)))
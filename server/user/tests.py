@@ -1,3 +1,236 @@
-from django.test import TestCase
+import asyncio
+import json
+from decimal import Decimal
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import TestCase, override_settings
+from eth_account import Account
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from djweb3.api import EthNode
+from djweb3.stream import HeadSubscription
+from djweb3.utils.tester import Tester
+from user import models
+from user.views import balance_events
+from user.authenticate import CustomAuthentication
+from user.tokens import Blacklist, OutstandingWriter
 
-# Create your tests here.
+PASSWORD = "test-password"
+
+TESTER = {**settings.ETH_NODE, "backend": "tester"}
+# logins queued until `tearDown` flushes them in the test transaction
+SIMPLE_JWT = {
+    **settings.SIMPLE_JWT,
+    "OUTSTANDING_BATCH": {"size": 1000, "interval": 3600},
+}
+
+
+@override_settings(
+    ETH_NODE=TESTER,
+    SIMPLE_JWT=SIMPLE_JWT,
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class UserTestCase(TestCase):
+    def setUp(self):
+        EthNode()
+        EthNode.head = None
+        EthNode.balances.clear()
+        Blacklist.checked_at = None
+        Blacklist.loaded_at = None
+        CustomAuthentication.tokens.clear()
+        # excluded from `auth/users`
+        models.User.objects.create_superuser(
+            "admin@example.com", PASSWORD, first_name="Admin", last_name="Admin"
+        )
+
+    def tearDown(self):
+        OutstandingWriter.flush()
+
+    def create_user(self, i, wei=0):
+        user = models.User.objects.create_user("user-%d@example.com" % i, PASSWORD)
+        user.wallet_address_eth = Account.create().address
+        user.save()
+        if wei:
+            Tester.fund(user.wallet_address_eth, wei)
+        return user
+
+    def login(self, email):
+        response = self.client.post(
+            "/auth/login",
+            {"email": email, "password": PASSWORD},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def bearer(self, tokens):
+        return {"HTTP_AUTHORIZATION": "Bearer %s" % tokens["access_token"]}
+
+
+class UsersPageTest(UserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.users = [self.create_user(i, (i + 1) * 10**18) for i in range(7)]
+        self.headers = self.bearer(self.login(self.users[0].email))
+
+    def get(self, **params):
+        return self.client.get("/auth/users", params, **self.headers)
+
+    def test_pages(self):
+        ids, cursor = [], 0
+        while cursor is not None:
+            response = self.get(cursor=cursor, size=3)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            ids += [user["id"] for user in body["page"]]
+            cursor = body["pagination"]["next"]
+        self.assertEqual(ids, [user.id for user in self.users])
+
+    def test_size_capped(self):
+        with self.settings(USERS_PAGE={**settings.USERS_PAGE, "max_size": 2}):
+            body = self.get(size=10**20).json()
+        self.assertEqual(len(body["page"]), 2)
+        self.assertEqual(body["pagination"]["size"], 2)
+        self.assertEqual(body["pagination"]["next"], self.users[1].id)
+
+    def test_total(self):
+        body = self.get(total=1).json()
+        self.assertEqual(body["pagination"]["total"], len(self.users))
+
+    def test_invalid_params(self):
+        for params in (
+            {"cursor": "a"},
+            {"cursor": -1},
+            {"cursor": 10**20},
+            {"size": 0},
+        ):
+            self.assertEqual(self.get(**params).status_code, 400)
+
+    def test_fields(self):
+        body = self.get(fields="email,id").json()
+        self.assertEqual(set(body["page"][0]), {"id", "email"})
+        self.assertEqual(self.get(fields="password").status_code, 400)
+
+    def test_balances(self):
+        body = self.get(fields="id,balance_eth", size=7).json()
+        self.assertEqual(
+            [Decimal(user["balance_eth"]) for user in body["page"]],
+            [Decimal(i + 1) for i in range(7)],
+        )
+
+
+class AuthTest(UserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user(0)
+
+    def test_user(self):
+        response = self.client.get(
+            "/auth/user",
+            {"fields": "email"},
+            **self.bearer(self.login(self.user.email))
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"email": self.user.email})
+
+    def test_no_token(self):
+        self.assertEqual(self.client.get("/auth/user").status_code, 401)
+
+    def test_stateless(self):
+        headers = self.bearer(self.login(self.user.email))
+        with self.settings(SIMPLE_JWT={**SIMPLE_JWT, "AUTH_STATELESS": True}):
+            # the user row is read by the view only
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        "/auth/user", {"fields": "email"}, **headers
+                    )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), {"email": self.user.email})
+
+    def test_stateless_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+        headers = self.bearer(self.login(self.user.email))
+        with self.settings(SIMPLE_JWT={**SIMPLE_JWT, "AUTH_STATELESS": True}):
+            with self.assertNumQueries(0):
+                response = self.client.get("/djweb3/timing/slow", **headers)
+            self.assertEqual(response.status_code, 200)
+
+    def test_refresh(self):
+        self.login(self.user.email)
+        response = self.client.post("/auth/refresh-token")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.json())
+
+    def test_logout_blacklists(self):
+        tokens = self.login(self.user.email)
+        response = self.client.post("/auth/logout", **self.bearer(tokens))
+        self.assertEqual(response.status_code, 200)
+        self.client.cookies[settings.SIMPLE_JWT["AUTH_COOKIE_REFRESH"]] = tokens[
+            "refresh_token"
+        ]
+        self.assertEqual(self.client.post("/auth/refresh-token").status_code, 401)
+
+    def test_blacklisted_elsewhere(self):
+        tokens = self.login(self.user.email)
+        self.assertEqual(self.client.post("/auth/refresh-token").status_code, 200)
+
+        # blacklisted by another process, found on the next reload
+        OutstandingWriter.flush()
+        BlacklistedToken.objects.create(
+            token=OutstandingToken.objects.get(token=tokens["refresh_token"])
+        )
+        Blacklist.checked_at = None
+        self.client.cookies[settings.SIMPLE_JWT["AUTH_COOKIE_REFRESH"]] = tokens[
+            "refresh_token"
+        ]
+        self.assertEqual(self.client.post("/auth/refresh-token").status_code, 401)
+
+
+class StreamTest(UserTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = self.create_user(0, 10**18)
+        # no `newHeads` subscription, the tests publish the heads
+        patcher = mock.patch.object(HeadSubscription, "__init__", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_no_websocket(self):
+        self.login(self.user.email)
+        with self.settings(ETH_NODE={**TESTER, "ws_address": None}):
+            response = self.client.get("/auth/user/stream")
+        self.assertEqual(response.status_code, 501)
+
+    def test_events(self):
+        address = self.user.wallet_address_eth
+
+        async def read():
+            events = balance_events(address)
+            frames = [await anext(events)]
+            Tester.fund(address, 10**18)
+            block_number = EthNode.w3.eth.block_number
+            await asyncio.to_thread(HeadSubscription.publish, block_number)
+            frames.append(await anext(events))
+            # no balance change: a keep-alive comment only
+            frames.append(await anext(events))
+            await events.aclose()
+            return frames, block_number
+
+        stream = {**TESTER["stream"], "keepalive": 0.1}
+        with self.settings(ETH_NODE={**TESTER, "stream": stream}):
+            frames, block_number = async_to_sync(read)()
+
+        events = []
+        for frame in frames[:2]:
+            event, data = frame.removesuffix("\n\n").split("\n")
+            self.assertEqual(event, "event: balance")
+            events.append(json.loads(data.removeprefix("data: ")))
+        self.assertEqual([Decimal(event["balance_eth"]) for event in events], [1, 2])
+        self.assertEqual(events[1]["block"], block_number)
+        self.assertEqual(frames[2], ": keep-alive\n\n")
+        self.assertEqual(HeadSubscription.listeners, set())
@@ -0,0 +1,178 @@
+import atexit
+import logging
+import threading
+from datetime import timedelta
+from time import monotonic
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+logger = logging.getLogger(__name__)
+
+
+class Blacklist:
+    """
+    JTIs of the blacklisted refresh tokens, held in memory
+
+    New rows are read every `ttl` seconds, the whole set every `rebuild`
+    seconds to drop the expired tokens. A token blacklisted by another
+    process is accepted for `ttl` seconds at most.
+
+    The ids are not in commit order, new rows are those blacklisted since
+    the previous read, `overlap` seconds before it included.
+    """
+
+    jtis = frozenset()
+    # wall clock time of the previous read, as `BlacklistedToken.blacklisted_at`
+    loaded_at = None
+    checked_at = None
+    rebuilt_at = None
+    __lock = threading.Lock()
+
+    @classmethod
+    def contains(cls, jti):
+        options = settings.SIMPLE_JWT["BLACKLIST_CACHE"]
+        now = monotonic()
+        if cls.checked_at is None or now - cls.checked_at >= options["ttl"]:
+            with cls.__lock:
+                # another thread may have reloaded while this one was waiting
+                if cls.checked_at is None or now - cls.checked_at >= options["ttl"]:
+                    cls.load(
+                        rebuild=cls.rebuilt_at is None
+                        or now - cls.rebuilt_at >= options["rebuild"]
+                    )
+        return jti in cls.jtis
+
+    @classmethod
+    def load(cls, rebuild):
+        now = aware_utcnow()
+        rows = BlacklistedToken.objects.all()
+        if rebuild or cls.loaded_at is None:
+            rebuild = True
+            rows = rows.filter(token__expires_at__gt=now)
+        else:
+            overlap = settings.SIMPLE_JWT["BLACKLIST_CACHE"]["overlap"]
+            rows = rows.filter(
+                blacklisted_at__gte=cls.loaded_at - timedelta(seconds=overlap)
+            )
+
+        jtis = set(rows.values_list("token__jti", flat=True))
+        cls.jtis = frozenset(jtis if rebuild else cls.jtis | jtis)
+        cls.loaded_at = now
+        cls.checked_at = monotonic()
+        if rebuild:
+            cls.rebuilt_at = cls.checked_at
+
+    @classmethod
+    def add(cls, jti):
+        with cls.__lock:
+            cls.jtis = cls.jtis | {jti}
+
+
+class OutstandingWriter:
+    """
+    `OutstandingToken` rows of the logins, inserted in batches by a
+    background thread rather than one INSERT per login
+
+    Rows still pending when the process dies are lost: the tokens stay
+    valid, only `blacklist()` creates their row on demand.
+    """
+
+    __pending = []
+    __flush = threading.Event()
+    __stop = threading.Event()
+    __thread = None
+    __exit_hook = False
+    __lock = threading.Lock()
+
+    @classmethod
+    def add(cls, row):
+        with cls.__lock:
+            cls.__pending.append(row)
+            pending = len(cls.__pending)
+            if cls.__thread is None:
+                cls.__thread = threading.Thread(
+                    target=cls.flush_forever, name="outstanding-tokens", daemon=True
+                )
+                cls.__thread.start()
+                if not cls.__exit_hook:
+                    atexit.register(cls.flush)
+                    cls.__exit_hook = True
+        if pending >= settings.SIMPLE_JWT["OUTSTANDING_BATCH"]["size"]:
+            cls.__flush.set()
+
+    @classmethod
+    def flush_forever(cls):
+        while not cls.__stop.is_set():
+            cls.__flush.wait(settings.SIMPLE_JWT["OUTSTANDING_BATCH"]["interval"])
+            cls.__flush.clear()
+            try:
+                cls.flush()
+            except Exception as e:
+                logger.error("outstanding tokens not written  %s", e)
+            finally:
+                close_old_connections()
+
+    @classmethod
+    def stop(cls):
+        """
+        Write the pending rows and stop the thread, e.g. before the DB goes
+        away; the next `add` starts it again
+        """
+        with cls.__lock:
+            thread, cls.__thread = cls.__thread, None
+        if thread is not None:
+            cls.__stop.set()
+            cls.__flush.set()
+            thread.join()
+            cls.__stop.clear()
+        cls.flush()
+
+    @classmethod
+    def flush(cls):
+        with cls.__lock:
+            rows = list(cls.__pending)
+            cls.__pending.clear()
+        if rows:
+            # a row created meanwhile by `blacklist()` wins
+            OutstandingToken.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class CachedRefreshToken(RefreshToken):
+    """
+    Refresh token checked against `Blacklist`, not a query per refresh
+    """
+
+    def check_blacklist(self):
+        if Blacklist.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        Blacklist.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
+
+    @classmethod
+    def for_user(cls, user):
+        # `Token.for_user`, without the INSERT of `BlacklistMixin.for_user`
+        token = super(BlacklistMixin, cls).for_user(user)
+        # copied to the access tokens, for `IsAdminUser` under `AUTH_STATELESS`
+        token["is_staff"] = user.is_staff
+        OutstandingWriter.add(
+            OutstandingToken(
+                user=user,
+                jti=token[api_settings.JTI_CLAIM],
+                token=str(token),
+                created_at=token.current_time,
+                expires_at=datetime_from_epoch(token["exp"]),
+            )
+        )
+        return token
@@ -6,6 +6,9 @@ from user.views import (
     logoutView,
     user,
     users,
+    user_stream,
+    user_async,
+    users_async,
 )
 
 app_name = "user"
@@ -17,4 +20,7 @@ urlpatterns = [
     path("logout", logoutView),
     path("user", user),
     path("users", users),
+    path("user/stream", user_stream),
+    path("async/user", user_async),
+    path("async/users", users_async),
 ]
@@ -1,24 +1,37 @@
+import asyncio
+import json
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
 from django.middleware import csrf
 from rest_framework import (
     exceptions as rest_exceptions,
     response,
     decorators as rest_decorators,
     permissions as rest_permissions,
+    renderers,
+    request as rest_request,
+    settings as rest_settings,
 )
 from rest_framework_simplejwt import (
-    tokens,
     views as jwt_views,
     serializers as jwt_serializers,
     exceptions as jwt_exceptions,
 )
 from user import serializers, models
-from django.core.paginator import Paginator
+from user.authenticate import StreamAuthentication
+from user.tokens import CachedRefreshToken
+from djweb3.api import AsyncEthNode
+from djweb3.stream import HeadSubscription
+from djweb3.utils.timing import Timing
+from django.db import connection
+from djweb3.utils.cache import LRUCache
 
 
 def get_user_tokens(user):
-    refresh = tokens.RefreshToken.for_user(user)
+    refresh = CachedRefreshToken.for_user(user)
     return {"refresh_token": str(refresh), "access_token": str(refresh.access_token)}
 
 
@@ -78,7 +91,7 @@ def registerView(request):
 def logoutView(request):
     try:
         refreshToken = request.COOKIES.get(settings.SIMPLE_JWT["AUTH_COOKIE_REFRESH"])
-        token = tokens.RefreshToken(refreshToken)
+        token = CachedRefreshToken(refreshToken)
         token.blacklist()
 
         res = response.Response()
@@ -95,6 +108,7 @@ def logoutView(request):
 
 class CookieTokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
     refresh = None
+    token_class = CachedRefreshToken
 
     def validate(self, attrs):
         attrs["refresh"] = self.context["request"].COOKIES.get("refresh")
@@ -128,35 +142,246 @@ class CookieTokenRefreshView(jwt_views.TokenRefreshView):
 @rest_decorators.api_view(["GET"])
 @rest_decorators.permission_classes([rest_permissions.IsAuthenticated])
 def user(request):
+    fields = serializers.UserSerializer.get_fields_param(request.query_params)
     try:
-        user = models.User.objects.get(id=request.user.id)
+        user = models.User.objects.only(
+            *serializers.UserSerializer.get_columns(fields)
+        ).get(id=request.user.id)
     except models.User.DoesNotExist:
-        return response.Response(status_code=404)
+        return response.Response(status=404)
 
-    serializer = serializers.UserSerializer(user)
-    return response.Response(serializer.data)
+    serializer = serializers.UserSerializer(
+        user,
+        fields=fields,
+        context=serializers.UserSerializer.prefetch_balances_eth([user], fields),
+    )
+    with Timing.measure("serialize"):
+        data = serializer.data
+    return response.Response(data)
 
 
 @rest_decorators.api_view(["GET"])
 @rest_decorators.permission_classes([rest_permissions.IsAuthenticated])
 def users(request):
+    fields = serializers.UserSerializer.get_fields_param(request.query_params)
+    users, pagination = get_users_page(request.query_params, fields)
+    serializer = serializers.UserSerializer(
+        users,
+        many=True,
+        fields=fields,
+        context=serializers.UserSerializer.prefetch_balances_eth(users, fields),
+    )
+    with Timing.measure("serialize"):
+        data = serializer.data
+    return response.Response({"page": data, "pagination": pagination})
+
+
+# largest primary key of a 64-bit integer column
+MAX_ID = 2**63 - 1
+
+
+def get_users_page(params, fields):
+    """
+    Keyset pagination on `id`: a page costs an index range scan, however deep
+
+    @param params: `cursor`, the last id of the previous page (0 for the first);
+        `size`, capped by `USERS_PAGE["max_size"]`; `total=1`, the approximate
+        number of users
+    @param fields: serialized fields, only their columns are loaded
+    @return: users, pagination
+    """
     try:
-        num = int(request.query_params["page"])
-        # Exclude Admin
-        users = models.User.objects.filter(id__gt=1)
-        generator = Paginator(users, 5)
-        if num <= generator.count:
-            users = generator.page(num).object_list
+        cursor = int(params.get("cursor", 0))
+        size = int(params.get("size", settings.USERS_PAGE["size"]))
+    except ValueError:
+        raise rest_exceptions.ParseError("cursor and size must be integers")
+    if cursor < 0 or size <= 0:
+        raise rest_exceptions.ParseError("cursor and size must be positive")
+    if cursor > MAX_ID:
+        # beyond a 64-bit column, the DB driver raises OverflowError
+        raise rest_exceptions.ParseError("cursor must be at most %d" % MAX_ID)
+    size = min(size, settings.USERS_PAGE["max_size"])
+
+    # Exclude Admin
+    users = list(
+        models.User.objects.filter(id__gt=max(cursor, 1))
+        .only(*serializers.UserSerializer.get_columns(fields))
+        .order_by("id")[: size + 1]
+    )
+    pagination = {
+        "cursor": cursor,
+        "size": size,
+        # one row more than the page tells whether there is a next one
+        "next": users[size - 1].id if len(users) > size else None,
+    }
+    if params.get("total") in ("1", "true"):
+        pagination["total"] = count_users()
+    return users[:size], pagination
+
+
+users_total = LRUCache(maxsize=1, ttl=settings.USERS_PAGE["total_ttl"])
+
+
+def count_users():
+    """
+    Approximate number of users: the planner statistics on PostgreSQL, else a
+    `COUNT(*)` cached for `USERS_PAGE["total_ttl"]` seconds
+    """
+    total = users_total.get("users")
+    if total is LRUCache.MISSING:
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                    [models.User._meta.db_table],
+                )
+                row = cursor.fetchone()
+            total = max(row[0], 0) if row else 0
+        else:
+            total = models.User.objects.count()
+        # minus Admin
+        total = max(total - 1, 0)
+        users_total.set("users", total)
+    return total
+
+
+# Native async views, for an ASGI server (`core.asgi`): the node is not
+# waited on by a worker thread, and the balances of a page are requested
+# concurrently. DRF views are sync only, authentication is run in a thread.
+
+
+def authenticate_request(request, authentication_classes=None):
+    """
+    DRF authentication + `IsAuthenticated` permission, for plain Django views
+    """
+    drf_request = rest_request.Request(
+        request,
+        authenticators=[
+            auth()
+            for auth in authentication_classes
+            or rest_settings.api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ],
+    )
+    if not rest_permissions.IsAuthenticated().has_permission(drf_request, None):
+        raise rest_exceptions.NotAuthenticated()
+    return drf_request
+
+
+def render(data, status=200):
+    return HttpResponse(
+        renderers.JSONRenderer().render(data),
+        status=status,
+        content_type="application/json",
+    )
+
+
+async def user_async(request):
+    if request.method != "GET":
+        return render({"detail": "Method not allowed."}, status=405)
+    try:
+        drf_request = await sync_to_async(authenticate_request)(request)
+        fields = serializers.UserSerializer.get_fields_param(request.GET)
+    except rest_exceptions.APIException as e:
+        return render({"detail": e.detail}, status=e.status_code)
+
+    try:
+        user = await models.User.objects.only(
+            *serializers.UserSerializer.get_columns(fields)
+        ).aget(id=drf_request.user.id)
     except models.User.DoesNotExist:
-        return response.Response(status_code=404)
-
-    serializer = serializers.UserSerializer(users, many=True)
-    return response.Response(
-        {
-            "page": serializer.data,
-            "pagination": {
-                "current": num,
-                "count": generator.page_range.stop,
-            },
-        }
+        return render({"detail": "Not found."}, status=404)
+
+    serializer = serializers.UserSerializer(
+        user,
+        fields=fields,
+        context=await serializers.UserSerializer.aprefetch_balances_eth([user], fields),
+    )
+    with Timing.measure("serialize"):
+        data = serializer.data
+    return render(data)
+
+
+async def users_async(request):
+    if request.method != "GET":
+        return render({"detail": "Method not allowed."}, status=405)
+    try:
+        await sync_to_async(authenticate_request)(request)
+        fields = serializers.UserSerializer.get_fields_param(request.GET)
+        users, pagination = await sync_to_async(get_users_page)(request.GET, fields)
+    except rest_exceptions.APIException as e:
+        return render({"detail": e.detail}, status=e.status_code)
+
+    serializer = serializers.UserSerializer(
+        users,
+        many=True,
+        fields=fields,
+        context=await serializers.UserSerializer.aprefetch_balances_eth(users, fields),
     )
+    with Timing.measure("serialize"):
+        data = serializer.data
+    return render({"page": data, "pagination": pagination})
+
+
+async def user_stream(request):
+    """
+    Server-Sent Events: the user's balance, pushed whenever a new block changes it
+
+    Served by the event loop under ASGI, a connected client holds no thread.
+    """
+    if request.method != "GET":
+        return render({"detail": "Method not allowed."}, status=405)
+    try:
+        drf_request = await sync_to_async(authenticate_request)(
+            request, [StreamAuthentication]
+        )
+    except rest_exceptions.APIException as e:
+        return render({"detail": e.detail}, status=e.status_code)
+
+    try:
+        user = await models.User.objects.only("id", "wallet_address_eth").aget(
+            id=drf_request.user.id
+        )
+    except models.User.DoesNotExist:
+        return render({"detail": "Not found."}, status=404)
+    if not user.wallet_address_eth:
+        return HttpResponse(status=204)
+    if settings.ETH_NODE["ws_address"] is None:
+        # no `newHeads` subscription without ETH_NODE_WS_ENDPOINT
+        return render({"detail": "Balance stream not available."}, status=501)
+
+    res = StreamingHttpResponse(
+        balance_events(user.wallet_address_eth),
+        content_type="text/event-stream",
+    )
+    res["Cache-Control"] = "no-cache"
+    # disable proxy buffering (nginx)
+    res["X-Accel-Buffering"] = "no"
+    return res
+
+
+async def balance_events(address):
+    node = AsyncEthNode()
+    block_number = await node.get_block_number()
+    event = {
+        "block": block_number,
+        "balance_eth": await node.get_balance(address, block_number),
+    }
+    HeadSubscription()
+    listener = HeadSubscription.subscribe(address, event["balance_eth"])
+    try:
+        while True:
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield "event: balance\ndata: %s\n\n" % json.dumps(
+                    event, cls=DjangoJSONEncoder
+                )
+            try:
+                event = await asyncio.wait_for(
+                    listener.events.get(),
+                    settings.ETH_NODE["stream"]["keepalive"],
+                )
+            except asyncio.TimeoutError:
+                event = None
+    finally:
+        HeadSubscription.unsubscribe(listener)